@@ -1,25 +1,78 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, Response, stream_with_context, g
+from datetime import datetime, timedelta
 import os
 import boto3
 import uuid
 from decimal import Decimal
 import json
+import base64
+import gzip
+import hashlib
 import requests
+import threading
+import time
 from huggingface_hub import InferenceClient
+try:
+    import brotli  # optional: enables Content-Encoding: br on JSON APIs
+except ImportError:
+    brotli = None
 
 from boto3.dynamodb.conditions import Key, Attr
 from botocore.exceptions import ClientError
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from catalog_digest import DIGEST_COLUMNS, build_digest
+from catalog_feed import CatalogFeed
+from catalog_snapshot import CatalogSnapshot, SnapshotStore
+from dynamo_utils import scan_all
+from exports import EXPORT_COLUMNS, csv_rows, ndjson_rows
+from invalidation_bus import create_bus
+from password_policy import PasswordPolicy
+from rate_limit import MemoryBucketStore, RateLimiter, SQLiteBucketStore
+from rollups import RevenueRollups
+from server_session import (DynamoDBSessionStore, MemorySessionStore,
+                            ServerSessionInterface)
+from similar_books import SimilarBooksIndex
+from singleflight import SingleFlight
+from title_matcher import TitleMatcher
 
 app = Flask(__name__)
 app.secret_key = 'bookbazaar-secret-key-2026'
 
+# Behind the AWS load balancer request.remote_addr is the balancer's address,
+# so anonymous users would all share one chatbot rate-limit bucket. Set
+# PROXY_HOPS to the number of proxies in front of the app (1 for an ALB) to
+# take the client address from X-Forwarded-For. Leave it at 0 when clients
+# connect directly, or they can spoof the header.
+PROXY_HOPS = int(os.environ.get('PROXY_HOPS', '0'))
+if PROXY_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_HOPS, x_proto=PROXY_HOPS)
+
 # Hugging Face Configuration
 HF_API_KEY = os.environ.get(
     'HF_TOKEN', 'test')
 HF_MODEL = os.environ.get('HF_MODEL', 'Qwen/Qwen2.5-72B-Instruct')
-HF_CLIENT = InferenceClient(api_key=HF_API_KEY) if HF_API_KEY else None
+# Point HF_BASE_URL at mock_inference_server.py to load-test without HF
+HF_BASE_URL = os.environ.get('HF_BASE_URL')
+if HF_BASE_URL:
+    HF_CLIENT = InferenceClient(base_url=HF_BASE_URL, api_key=HF_API_KEY)
+else:
+    HF_CLIENT = InferenceClient(api_key=HF_API_KEY) if HF_API_KEY else None
+
+# Identical chatbot prompts arriving together share a single LLM call
+_chatbot_flight = SingleFlight()
+
+# Per-user token bucket on /api/chatbot. Point CHATBOT_RATE_LIMIT_DB at a file
+# to share buckets between worker processes.
+CHATBOT_RATE_PER_MIN = float(os.environ.get('CHATBOT_RATE_PER_MIN', '20'))
+CHATBOT_BURST = int(os.environ.get('CHATBOT_BURST', '5'))
+_chatbot_rate_db = os.environ.get('CHATBOT_RATE_LIMIT_DB')
+chatbot_limiter = RateLimiter(
+    SQLiteBucketStore(
+        _chatbot_rate_db) if _chatbot_rate_db else MemoryBucketStore(),
+    rate=CHATBOT_RATE_PER_MIN / 60.0,
+    capacity=CHATBOT_BURST,
+    name='chatbot_ratelimit')
 
 # AWS Configuration
 REGION = 'us-east-1'
@@ -32,6 +85,56 @@ sns = boto3.client('sns', region_name=REGION)
 users_table = dynamodb.Table('BookBazaar_Users')
 books_table = dynamodb.Table('BookBazaar_Books')
 orders_table = dynamodb.Table('BookBazaar_Orders')
+# "customers also bought" lists written by copurchase_job.py
+recommendations_table = dynamodb.Table('BookBazaar_Recommendations')
+# hourly/daily revenue counters maintained on every order write
+rollups = RevenueRollups(dynamodb.Table('BookBazaar_Rollups'))
+# versioned log of every Books write, served by /api/catalog/changes
+catalog_feed = CatalogFeed(dynamodb.Table('BookBazaar_CatalogChanges'))
+
+# Tells the other workers about catalog writes so they drop their caches.
+# Use INVALIDATION_BUS=socket when running more than one worker per host.
+invalidation_bus = create_bus(os.environ.get('INVALIDATION_BUS', 'memory'),
+                              os.environ.get('INVALIDATION_BUS_DIR'))
+
+# Read-only columnar catalog in a memory-mapped file shared by all workers on
+# the host; one of them brings it up to date from the change feed whenever
+# the catalog version moves on
+catalog_snapshots = SnapshotStore(
+    os.environ.get('CATALOG_SNAPSHOT_DIR'),
+    scan=lambda: scan_all(books_table, ConsistentRead=True),
+    changes=catalog_feed.changes,
+    fetch=lambda ids: _batch_get_books(ids, consistent=True))
+
+# GSI on Orders: partition key status, sort key created_at
+ORDERS_STATUS_INDEX = 'status-created_at-index'
+ORDER_STATUSES = ['Placed', 'In Delivery', 'Delivered']
+
+# Session data lives server-side; the cookie only carries a session id.
+# The default needs the BookBazaar_Sessions table with TTL on expires_at (see
+# MILESTONE_4_BACKEND_SETUP.md). SESSION_BACKEND=memory keeps it in-process
+# (single worker only).
+if os.environ.get('SESSION_BACKEND', 'dynamodb') == 'memory':
+    app.session_interface = ServerSessionInterface(MemorySessionStore())
+else:
+    app.session_interface = ServerSessionInterface(
+        DynamoDBSessionStore(dynamodb.Table('BookBazaar_Sessions')))
+
+# Hashing method/cost from PASSWORD_HASH_METHOD; runs in a process pool
+password_policy = PasswordPolicy.from_env()
+
+# Saved addresses per user; keeps the user item bounded
+MAX_SAVED_ADDRESSES = 10
+
+# JSON API bodies smaller than this are not worth compressing
+JSON_COMPRESS_MIN_BYTES = 1024
+
+# Distinct books one /api/cart or /api/wishlist batch may touch; keeps the
+# single update expression well inside DynamoDB's 4KB limit
+MAX_BATCH_BOOKS = 25
+
+# Optional prebuilt similar-books index (see similar_books.py)
+SIMILAR_INDEX_PATH = os.environ.get('SIMILAR_INDEX_PATH')
 
 # SNS Topic ARN
 SNS_TOPIC_ARN = 'arn:aws:sns:eu-north-1:664418958020:bookbazar_topic'
@@ -48,6 +151,293 @@ def send_notification(subject, message):
         print(f"Error sending notification: {e}")
 
 
+# ==================== CATALOG CACHE ====================
+
+# Structures derived from the Books table (title matcher, ...) are cached per
+# catalog version. Every route that mutates Books logs the change to the
+# catalog feed and moves to the version it was given. Structures built only
+# from book content (titles, authors, genres, summaries) are keyed on the
+# content version instead, which the stock changes of checkouts leave alone.
+_catalog_lock = threading.Lock()
+_catalog_version = 0
+_content_version = 0
+_catalog_synced = False
+# How often each worker re-reads the feed's version. The invalidation bus
+# usually gets there first; this catches writes from other hosts, or from
+# workers on a bus this one cannot hear (INVALIDATION_BUS=memory).
+CATALOG_VERSION_TTL = float(os.environ.get('CATALOG_VERSION_TTL', '1'))
+_catalog_polled_at = 0.0
+_catalog_poll_lock = threading.Lock()
+_catalog_cache = {}
+
+# Books writes whose feed entry could not be written yet: book id -> (op, seq).
+# A background thread re-records them from the books' current state. The
+# queue is per process, so a change is only lost if the worker exits first.
+FEED_REPLAY_INTERVAL = 5
+_feed_backlog = {}
+_feed_backlog_seq = 0
+_feed_backlog_lock = threading.Lock()
+_feed_replayer = None
+
+
+def _bump_catalog_version(version, op=None):
+    """Invalidate catalog caches, adopting `version` from the feed if newer.
+
+    A stock-only change (`op='stock'`) keeps the content-keyed caches.
+    """
+    global _catalog_version, _content_version
+    with _catalog_lock:
+        _catalog_version = max(_catalog_version, version)
+        if op != 'stock':
+            _content_version = _catalog_version
+        for name, (content, built_at, _) in list(_catalog_cache.items()):
+            if built_at != (_content_version if content else _catalog_version):
+                del _catalog_cache[name]
+
+
+def _feed_fields(book):
+    return {k: v for k, v in (book or {}).items()
+            if k in BOOK_API_FIELDS and k != 'id'}
+
+
+def _record_catalog_change(op, book_id, fields):
+    version = catalog_feed.record(op, book_id, fields or None)
+    _bump_catalog_version(version, op)
+    try:
+        invalidation_bus.publish('catalog', {'version': version,
+                                             'op': op, 'book_id': str(book_id)})
+    except Exception as e:
+        print(f"Error publishing catalog invalidation: {e}")
+
+
+def _catalog_changed(op, book_id, book=None):
+    """Log a Books write to the change feed and invalidate catalog caches
+    here and, through the invalidation bus, in every other worker.
+
+    Never raises: the Books write has already happened, so a feed failure is
+    logged and the change queued for _replay_catalog_changes.
+    """
+    try:
+        _record_catalog_change(op, book_id, _feed_fields(book))
+    except Exception as e:
+        print(f"Error recording catalog change {op} {book_id}, queued for replay: {e}")
+        _queue_catalog_change(op, book_id)
+
+
+def _queue_catalog_change(op, book_id):
+    global _feed_backlog_seq, _feed_replayer
+    with _feed_backlog_lock:
+        prev = _feed_backlog.get(str(book_id), (None, 0))[0]
+        if prev is None or prev == op:
+            merged = op
+        elif 'insert' in (prev, op):
+            merged = 'insert'
+        else:
+            merged = 'update'
+        _feed_backlog_seq += 1
+        _feed_backlog[str(book_id)] = (merged, _feed_backlog_seq)
+        if _feed_replayer is None:
+            _feed_replayer = threading.Thread(
+                target=_replay_catalog_changes, name='catalog-feed-replay',
+                daemon=True)
+            _feed_replayer.start()
+
+
+def _replay_catalog_changes():
+    """Record queued changes until none are left, retrying every
+    FEED_REPLAY_INTERVAL seconds. Each entry describes the book as it is
+    now, so a late entry never rolls a newer one back."""
+    global _feed_replayer
+    while True:
+        time.sleep(FEED_REPLAY_INTERVAL)
+        with _feed_backlog_lock:
+            pending = dict(_feed_backlog)
+        for book_id, (op, seq) in pending.items():
+            try:
+                book = books_table.get_item(
+                    Key={'id': book_id}, ConsistentRead=True).get('Item')
+                if book is None:
+                    op, fields = 'delete', None
+                elif op == 'stock':
+                    fields = {'stock': int(book.get('stock', 0))}
+                else:
+                    op = 'update' if op == 'delete' else op
+                    fields = _feed_fields(book)
+                _record_catalog_change(op, book_id, fields)
+            except Exception as e:
+                print(f"Error replaying catalog change for {book_id}: {e}")
+                break
+            with _feed_backlog_lock:
+                # queued again meanwhile: that write still needs its entry
+                if _feed_backlog.get(book_id, (None, 0))[1] == seq:
+                    del _feed_backlog[book_id]
+        with _feed_backlog_lock:
+            if not _feed_backlog:
+                _feed_replayer = None
+                return
+
+
+def _on_invalidation(topic, message):
+    message = message or {}
+    if topic == 'catalog' and isinstance(message.get('version'), int):
+        _bump_catalog_version(message['version'], message.get('op'))
+
+
+invalidation_bus.subscribe(_on_invalidation)
+
+
+@app.before_request
+def _sync_catalog_version():
+    # once per worker process (after any fork): join the bus, then continue
+    # from the feed's version rather than from 0
+    global _catalog_synced
+    if not _catalog_synced:
+        _catalog_synced = True
+        try:
+            invalidation_bus.start()
+        except Exception as e:
+            print(f"Error starting invalidation bus: {e}")
+    _poll_catalog_version()
+
+
+def _poll_catalog_version():
+    """Adopt the feed's version if CATALOG_VERSION_TTL has passed since the
+    last look; one GetItem on the feed counter."""
+    global _catalog_polled_at
+    if time.monotonic() - _catalog_polled_at < CATALOG_VERSION_TTL:
+        return
+    # one thread polls; the others carry on with the version they have
+    if not _catalog_poll_lock.acquire(blocking=False):
+        return
+    try:
+        _catalog_polled_at = time.monotonic()
+        since = _catalog_version
+        latest = catalog_feed.latest()
+        if latest > since:
+            # stock-only moves (checkouts) keep the content caches
+            stock_only = since and _only_stock_changes(since, latest)
+            _bump_catalog_version(latest, 'stock' if stock_only else None)
+    except Exception as e:
+        print(f"Error reading catalog version: {e}")
+    finally:
+        _catalog_poll_lock.release()
+
+
+def _catalog_cached(name, build, content=False):
+    """Return `build()` for the current catalog version, building it at most once.
+
+    With `content` set the value is kept across stock-only changes.
+    """
+    with _catalog_lock:
+        version = _content_version if content else _catalog_version
+        entry = _catalog_cache.get(name)
+        if entry and entry[1] == version:
+            return entry[2]
+
+    value = build()
+    with _catalog_lock:
+        if version == (_content_version if content else _catalog_version):
+            _catalog_cache[name] = (content, version, value)
+    return value
+
+
+def _catalog_snapshot():
+    """The shared catalog snapshot; a private one from a scan if it fails."""
+    try:
+        snapshot = catalog_snapshots.current(_catalog_version)
+        if snapshot is not None:
+            return snapshot
+    except Exception as e:
+        print(f"Error reading catalog snapshot: {e}")
+    return CatalogSnapshot.from_books(scan_all(books_table), _catalog_version)
+
+
+def _catalog_books():
+    """Every book as a dict, for pages that render the whole catalog."""
+    return list(_catalog_snapshot())
+
+
+def _genre_counts(catalog, mask=None):
+    counts = {}
+    for genre, n in catalog.counts('genre', mask).items():
+        counts[genre or 'Unknown'] = counts.get(genre or 'Unknown', 0) + n
+    return counts
+
+
+def _get_title_matcher(all_books):
+    return _catalog_cached('title_matcher', lambda: TitleMatcher(all_books),
+                           content=True)
+
+
+def _get_prompt_digest(all_books):
+    return _catalog_cached('prompt_digest', lambda: build_digest(all_books))
+
+
+def _only_stock_changes(since, until, max_pages=10):
+    """True if the feed logged only stock changes in (since, until]."""
+    for _ in range(max_pages):
+        if since >= until:
+            return True
+        page = catalog_feed.changes(since, limit=1000)
+        if page['reset'] or any(c['op'] != 'stock' for c in page['changes']
+                                if c['version'] <= until):
+            return False
+        if page['version'] == since:
+            # the next entry is still on its way; assume the worst
+            return False
+        since = page['version']
+    return False
+
+
+def _content_unchanged_since(version):
+    """True if the feed logged only stock changes after `version`."""
+    if version >= _content_version:
+        return True
+    return _only_stock_changes(version, _content_version)
+
+
+def _build_similar_index(all_books):
+    if SIMILAR_INDEX_PATH and os.path.exists(SIMILAR_INDEX_PATH):
+        try:
+            index = SimilarBooksIndex.load(SIMILAR_INDEX_PATH)
+            if _content_unchanged_since(index.catalog_version):
+                return index
+        except Exception as e:
+            print(f"Error loading similar-books index: {e}")
+    if all_books is None:
+        all_books = _catalog_snapshot()
+    return SimilarBooksIndex.build(all_books, catalog_version=_catalog_version)
+
+
+def _get_similar_index(all_books=None):
+    return _catalog_cached('similar_index', lambda: _build_similar_index(all_books),
+                           content=True)
+
+
+def _batch_get_books(book_ids, fields=None, consistent=False):
+    """Fetch books by id with BatchGetItem, preserving the order of `book_ids`.
+
+    `fields` limits the attributes read (the id is always included).
+    """
+    ids = list(dict.fromkeys(str(b) for b in book_ids))
+    found = {}
+    projection = {}
+    if fields:
+        names = {f'#f{i}': f for i, f in enumerate(dict.fromkeys(['id', *fields]))}
+        projection = {'ProjectionExpression': ', '.join(names),
+                      'ExpressionAttributeNames': names}
+    for start in range(0, len(ids), 100):
+        request_items = {books_table.name: {
+            'Keys': [{'id': bid} for bid in ids[start:start + 100]],
+            'ConsistentRead': consistent, **projection}}
+        while request_items:
+            resp = dynamodb.batch_get_item(RequestItems=request_items)
+            for b in resp.get('Responses', {}).get(books_table.name, []):
+                found[str(b.get('id'))] = b
+            request_items = resp.get('UnprocessedKeys') or None
+    return [found[bid] for bid in ids if bid in found]
+
+
 def _normalize_book(book):
     """Normalize book data from DynamoDB for templates."""
     if not book:
@@ -68,6 +458,412 @@ def _normalize_book(book):
     return book
 
 
+# Fields the public book APIs may return, with their JSON conversions
+BOOK_API_FIELDS = {
+    'id': str,
+    'title': str,
+    'author': str,
+    'genre': str,
+    'price': float,
+    'stock': int,
+    'summary': str,
+    'cover_url': str,
+    'seller_name': str,
+}
+
+# Most Books items one filtered /api/books request may read. A selective
+# filter then returns a short (even empty) page plus a cursor to go on from.
+BOOKS_SCAN_BUDGET = int(os.environ.get('BOOKS_SCAN_BUDGET', '1000'))
+
+
+def _book_json(book, fields=BOOK_API_FIELDS):
+    return {f: BOOK_API_FIELDS[f](book[f]) for f in fields
+            if book.get(f) is not None}
+
+
+def _is_condition_failure(e):
+    return e.response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException'
+
+
+def _save_address(email, addr):
+    """Append `addr` to the user's saved addresses in one conditional update.
+
+    Returns False when the user already has MAX_SAVED_ADDRESSES addresses
+    (or no longer exists).
+    """
+    try:
+        users_table.update_item(
+            Key={'email': email},
+            UpdateExpression='SET addresses = list_append(if_not_exists(addresses, :empty), :new)',
+            ConditionExpression='attribute_exists(email) AND (attribute_not_exists(addresses) OR size(addresses) < :max)',
+            ExpressionAttributeValues={
+                ':empty': [], ':new': [addr], ':max': MAX_SAVED_ADDRESSES}
+        )
+        return True
+    except ClientError as e:
+        if _is_condition_failure(e):
+            return False
+        raise
+
+
+def _user_state(email):
+    """Cart and wishlist of the signed-in user, read at most once per request."""
+    if 'user_state' not in g:
+        try:
+            item = users_table.get_item(
+                Key={'email': email},
+                ProjectionExpression='cart, cart_count, wishlist').get('Item', {})
+        except Exception as e:
+            print(f"Error loading cart for {email}: {e}")
+            item = {}
+        g.user_state = {'cart': item.get('cart') or {},
+                        'cart_count': int(item.get('cart_count', 0)),
+                        # string set; DynamoDB drops the attribute when empty
+                        'wishlist': set(item.get('wishlist') or ())}
+    return g.user_state
+
+
+def _cart_update(email, **kwargs):
+    """update_item on the user's cart map, creating the map if missing.
+
+    Returns the UPDATED_NEW attributes.
+    """
+    g.pop('user_state', None)
+    kwargs.setdefault('ReturnValues', 'UPDATED_NEW')
+    try:
+        resp = users_table.update_item(Key={'email': email}, **kwargs)
+    except ClientError as e:
+        # SET cart.#id fails on accounts created before the cart map existed
+        if e.response.get('Error', {}).get('Code') != 'ValidationException':
+            raise
+        users_table.update_item(
+            Key={'email': email},
+            UpdateExpression='SET cart = if_not_exists(cart, :empty), cart_count = if_not_exists(cart_count, :zero)',
+            ExpressionAttributeValues={':empty': {}, ':zero': 0}
+        )
+        resp = users_table.update_item(Key={'email': email}, **kwargs)
+    return resp.get('Attributes', {})
+
+
+def _cart_add(email, book_id, delta=1):
+    """Change one cart line by `delta`; returns (line qty, cart count).
+
+    A decrement that would empty the line removes it instead.
+    """
+    kwargs = {
+        'UpdateExpression': 'SET cart.#id = if_not_exists(cart.#id, :zero) + :q ADD cart_count :q',
+        'ExpressionAttributeNames': {'#id': book_id},
+        'ExpressionAttributeValues': {':zero': 0, ':q': delta}
+    }
+    if delta < 0:
+        kwargs['ConditionExpression'] = 'cart.#id > :floor'
+        kwargs['ExpressionAttributeValues'][':floor'] = -delta
+    try:
+        attrs = _cart_update(email, **kwargs)
+    except ClientError as e:
+        if not _is_condition_failure(e):
+            raise
+        return _cart_set(email, book_id, 0)
+    return int(attrs['cart'][book_id]), int(attrs.get('cart_count', 0))
+
+
+def _cart_set(email, book_id, qty):
+    """Set (or with qty <= 0 remove) one cart line; returns (qty, cart count)."""
+    final, count = _cart_batch(
+        email, [{'op': 'set', 'book_id': book_id, 'qty': qty}])
+    return final[book_id], count
+
+
+def _batch_book_ids(ops):
+    if not isinstance(ops, list) or not ops:
+        raise ValueError('ops must be a non-empty list')
+    if not all(isinstance(op, dict) and op.get('book_id') for op in ops):
+        raise ValueError('every op needs a book_id')
+    ids = list(dict.fromkeys(str(op['book_id']) for op in ops))
+    if len(ids) > MAX_BATCH_BOOKS:
+        raise ValueError(f'at most {MAX_BATCH_BOOKS} books per batch')
+    return ids
+
+
+def _replay_cart_ops(current, ops):
+    """Apply ops in order over {book_id: qty}; returns final qty per book."""
+    final = {}
+    for op in ops:
+        bid = str(op['book_id'])
+        kind = op.get('op')
+        try:
+            qty = int(op.get('qty', 1 if kind == 'add' else 0))
+        except (TypeError, ValueError):
+            raise ValueError(f'invalid qty for book {bid}')
+        if kind == 'add':
+            qty += final.get(bid, current.get(bid, 0))
+        elif kind == 'remove':
+            qty = 0
+        elif kind != 'set':
+            raise ValueError(f'unknown cart op {kind!r}')
+        final[bid] = max(0, qty)
+    return final
+
+
+def _cart_batch(email, ops):
+    """Apply cart ops as one conditional update; returns (final qtys, count).
+
+    Ops are {'op': 'add'|'set'|'remove', 'book_id', 'qty'} and are replayed
+    over the current quantities, so each book is written once. Every changed
+    line is conditioned on the quantity it was read with, and the whole
+    batch is retried if any of them moved.
+    """
+    ids = _batch_book_ids(ops)
+    names = {f'#b{i}': bid for i, bid in enumerate(ids)}
+    for _ in range(3):
+        item = users_table.get_item(
+            Key={'email': email},
+            ProjectionExpression=', '.join(f'cart.{n}' for n in names) + ', cart_count',
+            ExpressionAttributeNames=names,
+            ConsistentRead=True).get('Item', {})
+        current = {bid: int(q) for bid, q in (item.get('cart') or {}).items()}
+        final = _replay_cart_ops(current, ops)
+
+        sets, removes, conditions = [], [], []
+        used = {}
+        values = {':delta': 0}
+        for name, bid in names.items():
+            old, new = current.get(bid, 0), final[bid]
+            if old == new:
+                continue
+            used[name] = bid
+            values[':delta'] += new - old
+            if old:
+                conditions.append(f'cart.{name} = :o{name[1:]}')
+                values[f':o{name[1:]}'] = old
+            else:
+                conditions.append(f'attribute_not_exists(cart.{name})')
+            if new:
+                sets.append(f'cart.{name} = :q{name[1:]}')
+                values[f':q{name[1:]}'] = new
+            else:
+                removes.append(f'cart.{name}')
+        if not used:
+            return final, int(item.get('cart_count', 0))
+
+        expression = 'ADD cart_count :delta'
+        if sets:
+            expression = 'SET ' + ', '.join(sets) + ' ' + expression
+        if removes:
+            expression += ' REMOVE ' + ', '.join(removes)
+        try:
+            attrs = _cart_update(email, UpdateExpression=expression,
+                                 ConditionExpression=' AND '.join(conditions),
+                                 ExpressionAttributeNames=used,
+                                 ExpressionAttributeValues=values)
+            return final, int(attrs.get('cart_count', 0))
+        except ClientError as e:
+            if not _is_condition_failure(e):
+                raise
+    raise RuntimeError(f"Cart for {email} kept changing; giving up")
+
+
+def _wishlist_add(email, book_id):
+    """Add one book to the wishlist set.
+
+    Returns the new wishlist count, or None if the book was already there.
+    """
+    g.pop('user_state', None)
+    try:
+        resp = users_table.update_item(
+            Key={'email': email},
+            UpdateExpression='ADD wishlist :ids, wishlist_count :one, wishlist_rev :one',
+            ConditionExpression='NOT contains(wishlist, :id)',
+            ExpressionAttributeValues={
+                ':ids': {book_id}, ':id': book_id, ':one': 1},
+            ReturnValues='UPDATED_NEW'
+        )
+        return int(resp['Attributes'].get('wishlist_count', 0))
+    except ClientError as e:
+        if _is_condition_failure(e):
+            return None
+        raise
+
+
+def _wishlist_remove(email, book_id):
+    """Remove one book from the wishlist set.
+
+    Returns the new wishlist count, or None if the book was not there.
+    """
+    g.pop('user_state', None)
+    try:
+        resp = users_table.update_item(
+            Key={'email': email},
+            UpdateExpression='DELETE wishlist :ids ADD wishlist_count :neg, wishlist_rev :one',
+            ConditionExpression='contains(wishlist, :id)',
+            ExpressionAttributeValues={
+                ':ids': {book_id}, ':id': book_id, ':neg': -1, ':one': 1},
+            ReturnValues='UPDATED_NEW'
+        )
+        return int(resp['Attributes'].get('wishlist_count', 0))
+    except ClientError as e:
+        if _is_condition_failure(e):
+            return None
+        raise
+
+
+def _wishlist_batch(email, ops):
+    """Apply wishlist ops atomically; returns ({book_id: in wishlist}, count).
+
+    Ops are {'op': 'add'|'remove'|'toggle', 'book_id'}. DynamoDB cannot ADD
+    and DELETE the same set in one update, so the new set is written whole,
+    guarded by `wishlist_rev` (bumped by every wishlist write).
+    """
+    _batch_book_ids(ops)
+    for _ in range(3):
+        item = users_table.get_item(
+            Key={'email': email},
+            ProjectionExpression='wishlist, wishlist_rev',
+            ConsistentRead=True).get('Item', {})
+        current = set(item.get('wishlist') or ())
+        wishlist = set(current)
+        touched = {}
+        for op in ops:
+            bid, kind = str(op['book_id']), op.get('op')
+            if kind == 'add' or (kind == 'toggle' and bid not in wishlist):
+                wishlist.add(bid)
+            elif kind in ('remove', 'toggle'):
+                wishlist.discard(bid)
+            else:
+                raise ValueError(f'unknown wishlist op {kind!r}')
+            touched[bid] = bid in wishlist
+        if wishlist == current:
+            return touched, len(current)
+
+        values = {':n': len(wishlist), ':one': 1}
+        if wishlist:
+            expression = 'SET wishlist = :set, wishlist_count = :n ADD wishlist_rev :one'
+            values[':set'] = wishlist
+        else:
+            # empty sets are not allowed
+            expression = 'REMOVE wishlist SET wishlist_count = :n ADD wishlist_rev :one'
+        if 'wishlist_rev' in item:
+            condition = 'wishlist_rev = :rev'
+            values[':rev'] = item['wishlist_rev']
+        else:
+            condition = 'attribute_not_exists(wishlist_rev)'
+        try:
+            g.pop('user_state', None)
+            users_table.update_item(
+                Key={'email': email},
+                UpdateExpression=expression,
+                ConditionExpression=condition,
+                ExpressionAttributeValues=values
+            )
+            return touched, len(wishlist)
+        except ClientError as e:
+            if not _is_condition_failure(e):
+                raise
+    raise RuntimeError(f"Wishlist for {email} kept changing; giving up")
+
+
+def _wishlist_count(email):
+    item = users_table.get_item(
+        Key={'email': email}, ProjectionExpression='wishlist_count',
+        ConsistentRead=True).get('Item', {})
+    return int(item.get('wishlist_count', 0))
+
+
+def _cart_summary(email, quantities, count):
+    """Line subtotals for `quantities` plus the cart total, for JSON replies."""
+    # strongly consistent: the reply reports a write made a moment ago
+    item = users_table.get_item(
+        Key={'email': email}, ProjectionExpression='cart',
+        ConsistentRead=True).get('Item', {})
+    cart = item.get('cart') or {}
+    prices = {str(b['id']): float(b.get('price', 0))
+              for b in _batch_get_books(cart.keys())}
+    total = sum(int(q) * prices[bid] for bid, q in cart.items() if bid in prices)
+    return {
+        'success': True,
+        'lines': {bid: {'qty': qty,
+                        'line_subtotal': round(qty * prices.get(bid, 0.0), 2)}
+                  for bid, qty in quantities.items()},
+        'total': round(total, 2),
+        'count': count,
+        'cart_count': count
+    }
+
+
+def _cart_json(email, book_id, qty, count):
+    """JSON for the cart page's single-line quantity controls."""
+    summary = _cart_summary(email, {book_id: qty}, count)
+    summary.update(summary['lines'][book_id])
+    return jsonify(summary)
+
+
+def _cart_clear(email):
+    g.pop('user_state', None)
+    users_table.update_item(
+        Key={'email': email},
+        UpdateExpression='SET cart = :empty, cart_count = :zero',
+        ExpressionAttributeValues={':empty': {}, ':zero': 0}
+    )
+
+
+def _encode_cursor(state):
+    return base64.urlsafe_b64encode(json.dumps(state).encode()).decode()
+
+
+def _decode_cursor(token):
+    try:
+        state = json.loads(base64.urlsafe_b64decode(token.encode()).decode())
+        return state if isinstance(state, dict) else None
+    except Exception:
+        return None
+
+
+def _orders_page(statuses, limit, cursor=None):
+    """Return (orders, next_cursor) for the newest `limit` orders in `statuses`.
+
+    Each status is a Query on the status/created_at index (newest first,
+    at most `limit` items); the per-status pages are merged by created_at.
+    `cursor` maps status -> index key of the last order already returned from
+    that status, or 'done' once it is exhausted.
+    """
+    cursor = cursor or {}
+    candidates = []
+    more = {}
+    for status in statuses:
+        position = cursor.get(status)
+        if position == 'done':
+            continue
+        kwargs = {
+            'IndexName': ORDERS_STATUS_INDEX,
+            'KeyConditionExpression': Key('status').eq(status),
+            'ScanIndexForward': False,
+            'Limit': limit
+        }
+        if position:
+            kwargs['ExclusiveStartKey'] = position
+        resp = orders_table.query(**kwargs)
+        items = resp.get('Items', [])
+        more[status] = ('LastEvaluatedKey' in resp, len(items))
+        candidates.extend((status, o) for o in items)
+
+    candidates.sort(key=lambda c: (c[1].get('created_at', ''),
+                    c[1].get('id', '')), reverse=True)
+    page = candidates[:limit]
+
+    next_state = dict(cursor)
+    taken = {}
+    for status, o in page:
+        taken[status] = taken.get(status, 0) + 1
+        next_state[status] = {'id': o['id'], 'status': o['status'],
+                              'created_at': o['created_at']}
+    for status, (has_more, returned) in more.items():
+        if not has_more and taken.get(status, 0) == returned:
+            next_state[status] = 'done'
+
+    exhausted = all(next_state.get(s) == 'done' for s in statuses)
+    return [o for _, o in page], (None if exhausted else _encode_cursor(next_state))
+
+
 # ==================== PUBLIC ROUTES ====================
 
 
@@ -92,36 +888,34 @@ def signup():
         flash('Email and password are required.', 'error')
         return redirect(url_for('index'))
 
-    # Check if user exists
+    password_hash = password_policy.hash(password)
+
+    # admins live in the same users table with role='admin'; the conditional
+    # put replaces a separate existence check
+    try:
+        users_table.put_item(
+            Item={
+                'email': email,
+                'name': name or '',
+                'password': password_hash,
+                'role': role,
+                'cart': {},
+                'cart_count': 0,
+                'created_at': datetime.utcnow().isoformat()
+            },
+            ConditionExpression='attribute_not_exists(email)'
+        )
+    except ClientError as e:
+        if not _is_condition_failure(e):
+            raise
+        flash('Admin already exists!' if role ==
+              'admin' else 'User already exists!', 'error')
+        return redirect(url_for('auth_page'))
+
     if role == 'admin':
-        # store admins in the same users table but mark role='admin' to avoid redundant admin table
-        response = users_table.get_item(Key={'email': email})
-        if 'Item' in response:
-            flash('Admin already exists!', 'error')
-            return redirect(url_for('auth_page'))
-
-        users_table.put_item(Item={
-            'email': email,
-            'name': name or '',
-            'password': generate_password_hash(password),
-            'role': 'admin',
-            'created_at': datetime.utcnow().isoformat()
-        })
         send_notification("New Admin Signup",
                           f"Admin {name} ({email}) has registered.")
     else:
-        response = users_table.get_item(Key={'email': email})
-        if 'Item' in response:
-            flash('User already exists!', 'error')
-            return redirect(url_for('auth_page'))
-
-        users_table.put_item(Item={
-            'email': email,
-            'name': name or '',
-            'password': generate_password_hash(password),
-            'role': role,
-            'created_at': datetime.utcnow().isoformat()
-        })
         send_notification("New User Signup",
                           f"User {name} ({email}) signed up as {role}.")
 
@@ -129,6 +923,23 @@ def signup():
     return redirect(url_for('auth_page'))
 
 
+def _rehash_password(email, old_hash, password):
+    """Upgrade a stored hash to the current policy after a good login."""
+    try:
+        users_table.update_item(
+            Key={'email': email},
+            UpdateExpression='SET #pw = :new',
+            # skip if the password changed since we read it
+            ConditionExpression='#pw = :old',
+            ExpressionAttributeNames={'#pw': 'password'},
+            ExpressionAttributeValues={
+                ':new': password_policy.hash(password), ':old': old_hash}
+        )
+    except ClientError as e:
+        if not _is_condition_failure(e):
+            print(f"Error upgrading password hash for {email}: {e}")
+
+
 @app.route('/login', methods=['POST'])
 def login():
     email = request.form.get('email')
@@ -138,17 +949,21 @@ def login():
     response = users_table.get_item(Key={'email': email})
     if 'Item' in response:
         user = response['Item']
-        if check_password_hash(user.get('password', ''), password):
+        ok, needs_rehash = password_policy.verify(
+            user.get('password', ''), password)
+        if ok:
+            if needs_rehash:
+                _rehash_password(email, user['password'], password)
             role = user.get('role', 'customer')
             is_admin = True if role == 'admin' else False
+            # new session id on login, so one planted beforehand is useless
+            session.regenerate()
             session['user'] = {
                 'email': email,
                 'name': user.get('name', ''),
                 'is_admin': is_admin,
                 'role': role
             }
-            session['cart'] = {}
-            session['wishlist'] = []
 
             if is_admin:
                 send_notification("Admin Login", f"Admin {email} logged in.")
@@ -176,9 +991,7 @@ def dashboard():
     if user.get('role') == 'seller':
         return redirect(url_for('seller_dashboard'))
 
-    # Get all books
-    response = books_table.scan()
-    books = [_normalize_book(b) for b in response.get('Items', [])]
+    books = [_normalize_book(b) for b in _catalog_books()]
 
     return render_template('customer_dashboard.html', user=user, books=books)
 
@@ -186,8 +999,7 @@ def dashboard():
 @app.route('/browse')
 def browse():
     user = session.get('user')
-    response = books_table.scan()
-    books = [_normalize_book(b) for b in response.get('Items', [])]
+    books = [_normalize_book(b) for b in _catalog_books()]
     return render_template('customer_dashboard.html', user=user, books=books)
 
 
@@ -210,15 +1022,15 @@ def admin_dashboard():
         return redirect(url_for('index'))
 
     users = users_table.scan().get('Items', [])
-    books = books_table.scan().get('Items', [])
-    orders = orders_table.scan().get('Items', [])
+    catalog = _catalog_snapshot()
+    order_totals = rollups.totals()
 
     total_users = len(users)
     total_customers = sum(1 for u in users if u.get('role') == 'customer')
     total_sellers = sum(1 for u in users if u.get('role') == 'seller')
-    total_books = len(books)
-    total_orders = len(orders)
-    total_revenue = sum(float(o.get('total', 0)) for o in orders)
+    total_books = len(catalog)
+    total_orders = order_totals['orders']
+    total_revenue = order_totals['revenue']
 
     stats = {
         'total_users': total_users,
@@ -229,8 +1041,9 @@ def admin_dashboard():
         'total_revenue': round(total_revenue, 2)
     }
 
-    recent_orders = sorted(orders, key=lambda x: x.get(
-        'created_at', ''), reverse=True)[:5]
+    # newest 5 across the status index: at most 5 items read per status
+    statuses = sorted(set(ORDER_STATUSES) | set(order_totals['statuses']))
+    recent_orders, _ = _orders_page(statuses, 5)
 
     return render_template('admin_dashboard.html', user=user, stats=stats, recent_orders=recent_orders)
 
@@ -333,8 +1146,7 @@ def admin_books():
         flash('Access denied.', 'error')
         return redirect(url_for('index'))
 
-    all_books = [_normalize_book(b)
-                 for b in books_table.scan().get('Items', [])]
+    all_books = [_normalize_book(b) for b in _catalog_books()]
     # derive genre list for filter dropdown
     genres = sorted(list({b.get('genre', 'Unknown') for b in all_books}))
 
@@ -369,18 +1181,21 @@ def admin_book_details(book_id):
     book = _normalize_book(response['Item'])
 
     if request.method == 'POST':
+        changes = {
+            'title': request.form.get('title'),
+            'author': request.form.get('author'),
+            'price': Decimal(str(request.form.get('price'))),
+            'stock': int(request.form.get('stock')),
+            'genre': request.form.get('genre'),
+            'summary': request.form.get('summary', '')
+        }
         books_table.update_item(
             Key={'id': book_id},
             UpdateExpression='SET title = :title, author = :author, price = :price, stock = :stock, genre = :genre, summary = :summary',
             ExpressionAttributeValues={
-                ':title': request.form.get('title'),
-                ':author': request.form.get('author'),
-                ':price': Decimal(str(request.form.get('price'))),
-                ':stock': int(request.form.get('stock')),
-                ':genre': request.form.get('genre'),
-                ':summary': request.form.get('summary', '')
-            }
+                f':{k}': v for k, v in changes.items()}
         )
+        _catalog_changed('update', book_id, changes)
         send_notification(
             "Book Updated", f"Admin updated book: {request.form.get('title')}")
         flash('Book updated successfully.', 'success')
@@ -397,6 +1212,7 @@ def admin_delete_book(book_id):
         return redirect(url_for('index'))
 
     books_table.delete_item(Key={'id': book_id})
+    _catalog_changed('delete', book_id)
     send_notification("Book Deleted", f"Admin deleted book ID: {book_id}")
     flash('Book deleted successfully.', 'success')
     return redirect(url_for('admin_books'))
@@ -495,7 +1311,15 @@ def admin_orders():
         flash('Access denied.', 'error')
         return redirect(url_for('index'))
 
-    raw_orders = orders_table.scan().get('Items', [])
+    status_filter = request.args.get('status') or 'all'
+    per_page = min(max(request.args.get('per_page', 25, type=int), 1), 100)
+    cursor = _decode_cursor(request.args.get('cursor', ''))
+
+    known_statuses = sorted(set(ORDER_STATUSES) | set(rollups.totals()['statuses']))
+    statuses = known_statuses if status_filter == 'all' else [status_filter]
+
+    # One bounded index query per status instead of scanning every order
+    raw_orders, next_cursor = _orders_page(statuses, per_page, cursor)
 
     # Normalize orders for template: ensure customer name/email, totals, items_count
     normalized = []
@@ -529,16 +1353,8 @@ def admin_orders():
         }
         normalized.append(order_info)
 
-    # sort
-    normalized = sorted(normalized, key=lambda x: x.get(
-        'created_at', ''), reverse=True)
-
-    status_filter = request.args.get('status', 'all')
-    if status_filter != 'all':
-        normalized = [o for o in normalized if o.get(
-            'status') == status_filter]
-
-    return render_template('admin_orders.html', user=user, orders=normalized, statuses=sorted(set(o.get('status') for o in normalized)), status_filter=status_filter)
+    return render_template('admin_orders.html', user=user, orders=normalized, statuses=known_statuses, status_filter=status_filter,
+                           per_page=per_page, next_cursor=next_cursor, is_first_page=cursor is None)
 
 
 @app.route('/admin/order/<order_id>')
@@ -614,53 +1430,54 @@ def admin_remove_order_item(order_id, item_id):
         flash('Access denied.', 'error')
         return redirect(url_for('index'))
 
-    # fetch order
-    resp = orders_table.get_item(Key={'id': order_id})
-    if 'Item' not in resp:
-        flash('Order not found.', 'error')
-        return redirect(url_for('admin_orders'))
-
-    order = resp['Item']
-    items = order.get('items', []) or []
-
-    # find and remove item (match book_id or id)
-    new_items = []
-    removed = False
-    for it in items:
-        it_id = it.get('book_id') or it.get('id') or str(it.get('id'))
-        if str(it_id) == str(item_id) and not removed:
-            removed = True
-            continue
-        new_items.append(it)
-
-    if not removed:
+    # The details page posts the item's list position and the order version
+    # it rendered; without them, look both up first.
+    try:
+        index = int(request.form['index'])
+        expected_version = int(request.form['version'])
+    except (KeyError, ValueError):
+        resp = orders_table.get_item(Key={'id': order_id})
+        if 'Item' not in resp:
+            flash('Order not found.', 'error')
+            return redirect(url_for('admin_orders'))
+        order = resp['Item']
+        index = next((i for i, it in enumerate(order.get('items', []) or [])
+                      if str(it.get('book_id') or it.get('id')) == str(item_id)), None)
+        expected_version = int(order.get('version', 0) or 0)
+
+    if index is None or index < 0:
         flash('Item not found in order.', 'error')
         return redirect(url_for('admin_order_details', order_id=order_id))
 
-    # recompute total
-    new_total = 0.0
-    for it in new_items:
-        try:
-            subtotal = it.get('subtotal', 0) or 0
-            if isinstance(subtotal, Decimal):
-                subtotal = float(subtotal)
-            else:
-                subtotal = float(subtotal)
-        except Exception:
-            subtotal = 0.0
-        new_total += subtotal
-
-    # update DynamoDB order
+    # Remove the item and subtract its subtotal in one update, guarded on the
+    # item still being at that position and the order version being unchanged.
+    item_path = f"#items[{index}]"
     try:
-        orders_table.update_item(
+        resp = orders_table.update_item(
             Key={'id': order_id},
-            UpdateExpression='SET items = :items, total = :total',
+            UpdateExpression=f'REMOVE {item_path} SET #total = #total - {item_path}.#subtotal ADD #v :one',
+            ConditionExpression=(f'({item_path}.book_id = :item_id OR {item_path}.id = :item_id) '
+                                 'AND (attribute_not_exists(#v) OR #v = :version)'),
+            ExpressionAttributeNames={
+                '#items': 'items', '#total': 'total', '#subtotal': 'subtotal', '#v': 'version'},
             ExpressionAttributeValues={
-                ':items': new_items,
-                ':total': Decimal(str(new_total))
-            }
+                ':item_id': str(item_id), ':version': expected_version, ':one': 1},
+            ReturnValues='ALL_OLD',
+            ReturnValuesOnConditionCheckFailure='ALL_OLD'
         )
+        order = resp.get('Attributes', {})
+        removed = (order.get('items') or [])[index]
+        rollups.item_removed(order, removed.get('subtotal', 0))
         flash('Item removed from order.', 'success')
+    except ClientError as e:
+        if not _is_condition_failure(e):
+            print(f"Error updating order: {e}")
+            flash('Failed to update order.', 'error')
+        elif 'Item' in e.response:
+            flash('Order changed since it was loaded. Please review and try again.', 'error')
+        else:
+            flash('Order not found.', 'error')
+            return redirect(url_for('admin_orders'))
     except Exception as e:
         print(f"Error updating order: {e}")
         flash('Failed to update order.', 'error')
@@ -676,30 +1493,26 @@ def admin_analytics():
         return redirect(url_for('index'))
 
     all_users = users_table.scan().get('Items', [])
-    all_books = books_table.scan().get('Items', [])
-    all_orders = orders_table.scan().get('Items', [])
+    catalog = _catalog_snapshot()
+    # order figures come from the rollups, not a scan of every order
+    order_totals = rollups.totals()
 
     total_users = len(all_users)
     total_customers = sum(1 for u in all_users if u.get('role') == 'customer')
     total_sellers = sum(1 for u in all_users if u.get('role') == 'seller')
-    total_books = len(all_books)
-    total_orders = len(all_orders)
+    total_books = len(catalog)
+    total_orders = order_totals['orders']
 
-    total_revenue = sum(float(o.get('total', 0)) for o in all_orders)
-    completed_orders = sum(
-        1 for o in all_orders if o.get('status') == 'Delivered')
+    total_revenue = order_totals['revenue']
+    status_stats = order_totals['statuses']
+    completed_orders = status_stats.get('Delivered', 0)
 
-    # Genre stats
-    genre_stats = {}
-    for book in all_books:
-        genre = book.get('genre', 'Unknown')
-        genre_stats[genre] = genre_stats.get(genre, 0) + 1
+    genre_stats = _genre_counts(catalog)
 
-    # Status stats
-    status_stats = {}
-    for order in all_orders:
-        status = order.get('status', 'Unknown')
-        status_stats[status] = status_stats.get(status, 0) + 1
+    # Daily revenue for the last 30 days
+    today = datetime.utcnow()
+    daily_revenue = rollups.series(
+        'day', (today - timedelta(days=29)).strftime('%Y-%m-%d'), today.strftime('%Y-%m-%d'))
 
     analytics = {
         'total_users': total_users,
@@ -711,12 +1524,76 @@ def admin_analytics():
         'total_revenue': round(total_revenue, 2),
         'average_order_value': round(total_revenue / max(total_orders, 1), 2),
         'genre_stats': genre_stats,
-        'status_stats': status_stats
+        'status_stats': status_stats,
+        'daily_revenue': daily_revenue
     }
 
     return render_template('admin_analytics.html', user=user, analytics=analytics)
 
 
+@app.route('/admin/analytics/timeseries')
+def admin_analytics_timeseries():
+    """Revenue, order count and AOV per hour/day bucket from the rollups.
+
+    Query args: granularity=hour|day, start/end as ISO dates or datetimes
+    (default: the last 30 days or 48 hours), seller=<email> (default: all).
+    """
+    user = session.get('user')
+    if not user or not user.get('is_admin'):
+        return jsonify({'error': 'Admin privileges required'}), 403
+
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in ('hour', 'day'):
+        return jsonify({'error': 'granularity must be hour or day'}), 400
+
+    now = datetime.utcnow()
+    span = timedelta(hours=47) if granularity == 'hour' else timedelta(days=29)
+    try:
+        end = datetime.fromisoformat(request.args['end']) if request.args.get('end') else now
+        start = datetime.fromisoformat(request.args['start']) if request.args.get('start') else end - span
+    except ValueError:
+        return jsonify({'error': 'start and end must be ISO dates'}), 400
+
+    fmt = '%Y-%m-%dT%H' if granularity == 'hour' else '%Y-%m-%d'
+    seller = request.args.get('seller') or None
+    points = rollups.series(granularity, start.strftime(fmt), end.strftime(fmt), seller)
+
+    return jsonify({'granularity': granularity, 'seller': seller or 'all', 'points': points})
+
+
+@app.route('/admin/export/<table>')
+def admin_export(table):
+    """Stream a whole table as CSV or NDJSON (?format=csv|ndjson)."""
+    user = session.get('user')
+    if not user or not user.get('is_admin'):
+        flash('Access denied.', 'error')
+        return redirect(url_for('index'))
+
+    tables = {'orders': orders_table, 'users': users_table, 'books': books_table}
+    if table not in tables:
+        flash('Unknown export.', 'error')
+        return redirect(url_for('admin_dashboard'))
+
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'ndjson'):
+        flash('Export format must be csv or ndjson.', 'error')
+        return redirect(url_for('admin_dashboard'))
+
+    # page through the table instead of loading every item at once
+    items = scan_all(tables[table], Limit=500)
+    if fmt == 'csv':
+        body, mimetype = csv_rows(items, EXPORT_COLUMNS[table]), 'text/csv'
+    else:
+        body, mimetype = ndjson_rows(items), 'application/x-ndjson'
+
+    filename = f"bookbazaar_{table}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.{fmt}"
+    send_notification("Data Export", f"Admin {user.get('email')} exported {table} ({fmt}).")
+    return Response(stream_with_context(body), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'Cache-Control': 'no-store'
+    })
+
+
 # ==================== SELLER ROUTES ====================
 
 
@@ -780,7 +1657,7 @@ def seller_add_book():
         book_id = str(uuid.uuid4())
         email = user.get('email')
 
-        books_table.put_item(Item={
+        book = {
             'id': book_id,
             'title': request.form.get('title'),
             'author': request.form.get('author'),
@@ -792,7 +1669,9 @@ def seller_add_book():
             'cover_url': request.form.get('cover_url', 'https://placehold.co/150x220/e0e0e0/333333?text=Book'),
             'stock': int(request.form.get('stock')),
             'created_at': datetime.utcnow().isoformat()
-        })
+        }
+        books_table.put_item(Item=book)
+        _catalog_changed('insert', book_id, book)
 
         send_notification("New Book Added",
                           f"Seller {email} added: {request.form.get('title')}")
@@ -809,19 +1688,6 @@ def seller_edit_book(book_id):
         flash('Access denied. Seller account required.', 'error')
         return redirect(url_for('index'))
 
-    # fetch book from DynamoDB
-    response = books_table.get_item(Key={'id': book_id})
-    if 'Item' not in response:
-        flash('Book not found.', 'error')
-        return redirect(url_for('seller_books'))
-
-    book = response['Item']
-
-    # ensure seller owns the book
-    if book.get('seller_email') != user.get('email'):
-        flash('You are not authorized to edit this book.', 'error')
-        return redirect(url_for('seller_books'))
-
     if request.method == 'POST':
         updates = {}
         # collect fields if provided
@@ -851,25 +1717,56 @@ def seller_edit_book(book_id):
 
         if updates:
             expr_parts = []
-            expr_values = {}
+            expr_names = {}
+            expr_values = {':me': user.get('email')}
             for k, v in updates.items():
-                expr_parts.append(f"{k} = :{k}")
+                expr_parts.append(f"#{k} = :{k}")
+                expr_names[f"#{k}"] = k
                 expr_values[f":{k}"] = v
 
             update_expr = 'SET ' + ', '.join(expr_parts)
             try:
-                books_table.update_item(
+                # ownership check and write in one round trip
+                resp = books_table.update_item(
                     Key={'id': book_id},
                     UpdateExpression=update_expr,
-                    ExpressionAttributeValues=expr_values
+                    ConditionExpression='seller_email = :me',
+                    ExpressionAttributeNames=expr_names,
+                    ExpressionAttributeValues=expr_values,
+                    ReturnValues='ALL_NEW',
+                    ReturnValuesOnConditionCheckFailure='ALL_OLD'
                 )
-                send_notification(
-                    "Book Updated", f"Seller {user.get('email')} updated book: {updates.get('title', book.get('title'))}")
-                flash('Book updated successfully.', 'success')
+            except ClientError as e:
+                if not _is_condition_failure(e):
+                    print(f"Error updating book: {e}")
+                    flash('Failed to update book.', 'error')
+                elif 'Item' in e.response:
+                    flash('You are not authorized to edit this book.', 'error')
+                else:
+                    flash('Book not found.', 'error')
             except Exception as e:
                 print(f"Error updating book: {e}")
                 flash('Failed to update book.', 'error')
+            else:
+                # the update is saved; nothing after it may report a failure
+                _catalog_changed('update', book_id, updates)
+                send_notification(
+                    "Book Updated", f"Seller {user.get('email')} updated book: {resp['Attributes'].get('title')}")
+                flash('Book updated successfully.', 'success')
+
+        return redirect(url_for('seller_books'))
+
+    # fetch book from DynamoDB to prefill the form
+    response = books_table.get_item(Key={'id': book_id})
+    if 'Item' not in response:
+        flash('Book not found.', 'error')
+        return redirect(url_for('seller_books'))
 
+    book = response['Item']
+
+    # ensure seller owns the book
+    if book.get('seller_email') != user.get('email'):
+        flash('You are not authorized to edit this book.', 'error')
         return redirect(url_for('seller_books'))
 
     return render_template('seller_add_book.html', user=user, book=book)
@@ -882,24 +1779,30 @@ def seller_delete_book(book_id):
         flash('Access denied. Seller account required.', 'error')
         return redirect(url_for('index'))
 
-    response = books_table.get_item(Key={'id': book_id})
-    if 'Item' not in response:
-        flash('Book not found.', 'error')
-        return redirect(url_for('seller_books'))
-
-    book = response['Item']
-    if book.get('seller_email') != user.get('email'):
-        flash('You are not authorized to delete this book.', 'error')
-        return redirect(url_for('seller_books'))
-
     try:
-        books_table.delete_item(Key={'id': book_id})
-        send_notification(
-            'Book Deleted', f"Seller {user.get('email')} deleted book: {book.get('title')}")
-        flash('Book deleted successfully.', 'success')
+        resp = books_table.delete_item(
+            Key={'id': book_id},
+            ConditionExpression='seller_email = :me',
+            ExpressionAttributeValues={':me': user.get('email')},
+            ReturnValues='ALL_OLD',
+            ReturnValuesOnConditionCheckFailure='ALL_OLD'
+        )
+    except ClientError as e:
+        if not _is_condition_failure(e):
+            print(f"Error deleting book: {e}")
+            flash('Failed to delete book.', 'error')
+        elif 'Item' in e.response:
+            flash('You are not authorized to delete this book.', 'error')
+        else:
+            flash('Book not found.', 'error')
     except Exception as e:
         print(f"Error deleting book: {e}")
         flash('Failed to delete book.', 'error')
+    else:
+        _catalog_changed('delete', book_id)
+        send_notification(
+            'Book Deleted', f"Seller {user.get('email')} deleted book: {resp['Attributes'].get('title')}")
+        flash('Book deleted successfully.', 'success')
 
     return redirect(url_for('seller_books'))
 
@@ -975,34 +1878,34 @@ def seller_update_order_status(order_id):
         flash('Access denied. Seller account required.', 'error')
         return redirect(url_for('index'))
 
-    # Fetch the order item from DynamoDB
-    try:
-        resp = orders_table.get_item(Key={'id': order_id})
-    except Exception as e:
-        print(f"Error fetching order {order_id}: {e}")
-        flash('Failed to update order.', 'error')
-        return redirect(url_for('seller_orders'))
-
-    if 'Item' not in resp:
-        flash('Order not found.', 'error')
-        return redirect(url_for('seller_orders'))
-
-    order = resp['Item']
-    seller_email = order.get('seller_email')
-    if seller_email != user.get('email'):
-        flash('You are not authorized to update this order.', 'error')
+    new_status = request.form.get('status')
+    if not new_status:
+        flash('Please select a status.', 'error')
         return redirect(url_for('seller_orders'))
 
-    new_status = request.form.get('status') or order.get('status')
-
     try:
-        orders_table.update_item(
+        # ownership check and write in one round trip; the old image feeds the rollups
+        resp = orders_table.update_item(
             Key={'id': order_id},
-            UpdateExpression='SET #s = :s',
-            ExpressionAttributeNames={'#s': 'status'},
-            ExpressionAttributeValues={':s': new_status}
+            UpdateExpression='SET #s = :s ADD #v :one',
+            ConditionExpression='seller_email = :me',
+            ExpressionAttributeNames={'#s': 'status', '#v': 'version'},
+            ExpressionAttributeValues={
+                ':s': new_status, ':me': user.get('email'), ':one': 1},
+            ReturnValues='ALL_OLD',
+            ReturnValuesOnConditionCheckFailure='ALL_OLD'
         )
+        order = resp.get('Attributes', {})
+        rollups.status_changed(order, order.get('status'), new_status)
         flash('Order status updated.', 'success')
+    except ClientError as e:
+        if not _is_condition_failure(e):
+            print(f"Error updating order status: {e}")
+            flash('Failed to update order status.', 'error')
+        elif 'Item' in e.response:
+            flash('You are not authorized to update this order.', 'error')
+        else:
+            flash('Order not found.', 'error')
     except Exception as e:
         print(f"Error updating order status: {e}")
         flash('Failed to update order status.', 'error')
@@ -1020,23 +1923,21 @@ def cart():
         flash('Please sign in.', 'error')
         return redirect(url_for('auth_page'))
 
-    cart_data = session.get('cart', {})
+    cart_data = _user_state(user['email'])['cart']
     cart_items = []
     total = 0.0
 
-    # Fetch all books once and index by id to avoid per-item get_item mismatches
+    # Look books up in the shared catalog snapshot rather than scanning Books
     try:
-        response = books_table.scan()
-        all_books = response.get('Items', [])
-        books_index = {str(b.get('id')): b for b in all_books}
-    except Exception:
-        books_index = {}
+        snapshot = _catalog_snapshot()
+    except Exception as e:
+        print(f"Error reading catalog snapshot: {e}")
+        snapshot = None
 
-    # Build cart items from session, using indexed books
+    # Build cart items from the stored cart
     for book_id, qty in cart_data.items():
-        # try indexed lookup first
-        book = books_index.get(str(book_id))
-        # fallback to direct get_item if scan didn't include it (safer for inconsistent id types)
+        book = snapshot.get(book_id) if snapshot is not None else None
+        # fallback to direct get_item if the snapshot didn't include it
         if not book:
             try:
                 resp = books_table.get_item(Key={'id': book_id})
@@ -1080,11 +1981,7 @@ def add_to_cart(book_id):
     if not user:
         return jsonify({'error': 'Please sign in'}), 401
 
-    cart = session.get('cart', {})
-    cart[book_id] = cart.get(book_id, 0) + 1
-    session['cart'] = cart
-
-    cart_count = sum(int(q) for q in cart.values())
+    _, cart_count = _cart_add(user['email'], book_id)
     return jsonify({'success': True, 'count': cart_count})
 
 
@@ -1094,16 +1991,18 @@ def update_cart(book_id):
     if not user:
         return jsonify({'error': 'Please sign in'}), 401
 
-    qty = request.json.get('qty', 0)
-    cart = session.get('cart', {})
-
-    if qty <= 0:
-        cart.pop(book_id, None)
+    email = user['email']
+    op = request.form.get('op')
+    if op in ('inc', 'dec'):
+        qty, cart_count = _cart_add(email, book_id, 1 if op == 'inc' else -1)
     else:
-        cart[book_id] = qty
+        try:
+            qty = int((request.get_json(silent=True) or {}).get('qty', 0))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Invalid quantity'}), 400
+        qty, cart_count = _cart_set(email, book_id, qty)
 
-    session['cart'] = cart
-    return jsonify({'success': True})
+    return _cart_json(email, book_id, qty, cart_count)
 
 
 @app.route('/cart/remove/<book_id>', methods=['POST'])
@@ -1112,11 +2011,38 @@ def remove_from_cart(book_id):
     if not user:
         return jsonify({'error': 'Please sign in'}), 401
 
-    cart = session.get('cart', {})
-    cart.pop(book_id, None)
-    session['cart'] = cart
+    _, cart_count = _cart_set(user['email'], book_id, 0)
+    return _cart_json(user['email'], book_id, 0, cart_count)
+
+
+@app.route('/api/cart/batch', methods=['POST'])
+def cart_batch():
+    user = session.get('user')
+    if not user:
+        return jsonify({'error': 'Please sign in'}), 401
+
+    ops = (request.get_json(silent=True) or {}).get('ops')
+    try:
+        final, cart_count = _cart_batch(user['email'], ops)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify(_cart_summary(user['email'], final, cart_count))
+
 
-    return jsonify({'success': True})
+@app.route('/api/wishlist/batch', methods=['POST'])
+def wishlist_batch():
+    user = session.get('user')
+    if not user:
+        return jsonify({'error': 'Please sign in'}), 401
+
+    ops = (request.get_json(silent=True) or {}).get('ops')
+    try:
+        wishlist, count = _wishlist_batch(user['email'], ops)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({'success': True, 'wishlist': wishlist, 'count': count})
 
 
 @app.route('/wishlist/toggle/<book_id>', methods=['POST'])
@@ -1125,17 +2051,35 @@ def toggle_wishlist(book_id):
     if not user:
         return jsonify({'error': 'Please sign in'}), 401
 
-    wishlist = session.get('wishlist', [])
-
-    if book_id in wishlist:
-        wishlist.remove(book_id)
+    email = user['email']
+    # action=add|remove says what the client's heart button meant, so it is
+    # one conditional update whose reply carries the new count. A repeat
+    # (double click, retry) fails the condition and changes nothing.
+    action = request.values.get('action') or \
+        (request.get_json(silent=True) or {}).get('action')
+    if action not in (None, 'add', 'remove'):
+        return jsonify({'error': 'action must be add or remove'}), 400
+
+    if action == 'remove':
+        count = _wishlist_remove(email, book_id)
         added = False
-    else:
-        wishlist.append(book_id)
+    elif action == 'add':
+        count = _wishlist_add(email, book_id)
         added = True
+    else:
+        # bare toggle: the conditional ADD and DELETE decide atomically
+        for _ in range(3):
+            count = _wishlist_add(email, book_id)
+            added = count is not None
+            if not added:
+                count = _wishlist_remove(email, book_id)
+            if count is not None:
+                break
+    if count is None:
+        # already in the requested state; report the count without writing
+        count = _wishlist_count(email)
 
-    session['wishlist'] = wishlist
-    return jsonify({'added': added, 'count': len(wishlist)})
+    return jsonify({'added': added, 'count': count})
 
 
 @app.route('/wishlist')
@@ -1144,13 +2088,9 @@ def wishlist():
     if not user:
         return redirect(url_for('index'))
 
-    wishlist_ids = session.get('wishlist', [])
-    wishlist_items = []
-
-    for book_id in wishlist_ids:
-        response = books_table.get_item(Key={'id': book_id})
-        if 'Item' in response:
-            wishlist_items.append(_normalize_book(response['Item']))
+    wishlist_ids = sorted(_user_state(user['email'])['wishlist'])
+    wishlist_items = [_normalize_book(b)
+                      for b in _batch_get_books(wishlist_ids)]
 
     return render_template('wishlist.html', user=user, items=wishlist_items)
 
@@ -1187,18 +2127,11 @@ def add_address_profile():
         'phone': request.form.get('phone', ''),
     }
 
-    response = users_table.get_item(Key={'email': email})
-    user_data = response.get('Item', {})
-    addresses = user_data.get('addresses', [])
-    addresses.append(addr)
-
-    users_table.update_item(
-        Key={'email': email},
-        UpdateExpression='SET addresses = :addresses',
-        ExpressionAttributeValues={':addresses': addresses}
-    )
-
-    flash('Address added.', 'success')
+    if _save_address(email, addr):
+        flash('Address added.', 'success')
+    else:
+        flash(
+            f'You can save up to {MAX_SAVED_ADDRESSES} addresses.', 'error')
     return redirect(url_for('profile'))
 
 
@@ -1230,15 +2163,11 @@ def payment():
                 'phone': request.form.get('phone', ''),
             }
 
-            if request.form.get('save_address'):
-                addresses.append(addr)
-                users_table.update_item(
-                    Key={'email': email},
-                    UpdateExpression='SET addresses = :addresses',
-                    ExpressionAttributeValues={':addresses': addresses}
-                )
+            if request.form.get('save_address') and not _save_address(email, addr):
+                flash(
+                    f'Address not saved: you can save up to {MAX_SAVED_ADDRESSES} addresses.', 'info')
 
-        cart = session.get('cart', {})
+        cart = _user_state(email)['cart']
         if not cart:
             flash('Your cart is empty.', 'error')
             return redirect(url_for('cart'))
@@ -1314,7 +2243,7 @@ def payment():
                 }
                 safe_items.append(safe_item)
 
-            orders_table.put_item(Item={
+            order_item = {
                 'id': f"{order_id}-{seller_email}",
                 'original_order_id': order_id,
                 'buyer_email': email,
@@ -1325,7 +2254,9 @@ def payment():
                 'items': safe_items,
                 'total': Decimal(str(seller_total)),
                 'shipping_address': addr
-            })
+            }
+            orders_table.put_item(Item=order_item)
+            rollups.order_placed(order_item)
 
         # Update stock
         for item in items:
@@ -1338,12 +2269,13 @@ def payment():
                     UpdateExpression='SET stock = :stock',
                     ExpressionAttributeValues={':stock': new_stock}
                 )
+                _catalog_changed('stock', item['book_id'], {'stock': new_stock})
 
         send_notification(
             "New Order", f"Order {order_id} placed by {email} for ${total:.2f}")
 
         flash('Order placed (Cash on Delivery).', 'success')
-        session['cart'] = {}
+        _cart_clear(email)
         return redirect(url_for('orders'))
 
     return render_template('payment.html', user=user, addresses=addresses)
@@ -1368,6 +2300,17 @@ def orders():
 @app.route('/api/chatbot', methods=['POST'])
 def chatbot_api():
     """Chatbot API endpoint with LLM integration and DynamoDB context"""
+    limit_key = (session.get('user') or {}).get('email') or request.remote_addr
+    allowed, retry_after = chatbot_limiter.hit(f"chatbot:{limit_key}")
+    if not allowed:
+        return jsonify({
+            'error': 'Too many requests',
+            'response': f"You're sending messages too quickly. Please try again in {retry_after} second(s).",
+            'books': [],
+            'actions': [],
+            'source': 'system'
+        }), 429, {'Retry-After': str(retry_after)}
+
     try:
         data = request.get_json()
         message = data.get('message', '').strip()
@@ -1375,10 +2318,9 @@ def chatbot_api():
         if not message:
             return jsonify({'error': 'Message is required'}), 400
 
-        # Get available books from DynamoDB
-        response = books_table.scan()
-        all_books = response.get('Items', [])
-        available_books = [b for b in all_books if int(b.get('stock', 0)) > 0]
+        # columns of the shared snapshot; no per-request copy of the catalog
+        catalog = _catalog_snapshot()
+        in_stock = catalog.in_stock()
 
         # Get user's orders if logged in
         user = session.get('user')
@@ -1393,26 +2335,12 @@ def chatbot_api():
                 user_orders = resp.get('Items', [])
             except Exception:
                 user_orders = []
-            user_wishlist = session.get('wishlist', [])
-
-        # Build a minimal book context for the LLM
-        books_context = []
-        for b in available_books:
-            books_context.append({
-                'id': str(b.get('id')),
-                'title': b.get('title', ''),
-                'author': b.get('author', ''),
-                'genre': b.get('genre', 'Unknown'),
-                'price': float(b.get('price', 0) or 0),
-                'stock': int(b.get('stock', 0) or 0),
-                'summary': b.get('summary', '')
-            })
+            user_wishlist = _user_state(email)['wishlist']
 
-        genres = sorted({b.get('genre', 'Unknown') for b in available_books})
+        genres = sorted(_genre_counts(catalog, in_stock))
         context = {
-            'total_books': len(available_books),
+            'total_books': int(in_stock.sum()),
             'genres': genres,
-            'all_books': books_context,
             'user_orders_count': len(user_orders),
             'user_wishlist_count': len(user_wishlist)
         }
@@ -1432,7 +2360,8 @@ def chatbot_api():
 DATABASE CONTEXT:
 - Total books in stock: {context['total_books']}
 - Available genres: {', '.join(context['genres'])}
-- Books database: {json.dumps(books_context, indent=2)}
+- Books database (one per line, columns {DIGEST_COLUMNS}):
+{_get_prompt_digest(catalog)}
 
 USER CONTEXT:
 - Orders placed: {context['user_orders_count']}
@@ -1463,19 +2392,15 @@ Response: {{"message": "I've added 'The Great Gatsby' to your wishlist!",
     "recommended_books": [1], "action": "add_to_wishlist"}}
 """
 
-                completion = HF_CLIENT.chat.completions.create(
-                    model=HF_MODEL,
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": message}
-                    ],
-                    max_tokens=500,
-                    temperature=0.7
-                )
-
-                ai_response = completion.choices[0].message.content.strip()
+                # Coalesce on everything that shapes the prompt: the
+                # normalized message, catalog version and user counters.
+                flight_key = (' '.join(message.lower().split()), _catalog_version,
+                              context['user_orders_count'], context['user_wishlist_count'])
+                ai_response, shared = _chatbot_flight.do(
+                    flight_key, lambda: _chatbot_completion(system_prompt, message))
                 used_ai = True
-                print(f"[DEBUG] AI Response: {ai_response}")
+                print(
+                    f"[DEBUG] AI Response{' (shared)' if shared else ''}: {ai_response}")
 
                 try:
                     parsed_response = json.loads(ai_response)
@@ -1489,13 +2414,9 @@ Response: {{"message": "I've added 'The Great Gatsby' to your wishlist!",
                             {'type': 'add_to_wishlist', 'book_ids': recommended_books})
                 except json.JSONDecodeError:
                     response_text = ai_response
-                    for book in available_books:
-                        if book.get('title') and book['title'].lower() in message.lower():
-                            bid = book.get('id')
-                            if bid is not None:
-                                bid = str(bid)
-                                if bid not in recommended_books:
-                                    recommended_books.append(bid)
+                    for bid in _get_title_matcher(catalog).match_books(message):
+                        if catalog.is_available(bid) and bid not in recommended_books:
+                            recommended_books.append(bid)
 
             except Exception as e:
                 print(f"[ERROR] HuggingFace API Error: {e}")
@@ -1505,7 +2426,9 @@ Response: {{"message": "I've added 'The Great Gatsby' to your wishlist!",
         if not response_text:
             print(f"[DEBUG] Using fallback pattern matching")
             fallback_result = generate_smart_fallback(
-                message.lower(), context, available_books, user_wishlist)
+                message.lower(), context, catalog, user_wishlist,
+                matcher=_get_title_matcher(catalog),
+                get_similar_index=lambda: _get_similar_index(catalog))
             response_text = fallback_result['message']
             recommended_books = fallback_result.get('recommended_books', [])
             if fallback_result.get('action') == 'add_to_wishlist':
@@ -1517,9 +2440,7 @@ Response: {{"message": "I've added 'The Great Gatsby' to your wishlist!",
         for book_id in recommended_books[:3]:
             # treat ids as strings
             bid = str(book_id)
-            # find in all_books
-            book = next((b for b in all_books if str(
-                b.get('id', '')) == bid), None)
+            book = catalog.get(bid)
             if book:
                 books_to_display.append({
                     'id': str(book.get('id')),
@@ -1533,28 +2454,61 @@ Response: {{"message": "I've added 'The Great Gatsby' to your wishlist!",
 
         source = 'ai' if used_ai else 'system'
 
-        return jsonify({'response': response_text, 'books': books_to_display, 'actions': actions, 'source': source})
+        return jsonify({'response': response_text, 'books': books_to_display, 'actions': actions, 'source': source,
+                        'catalog_version': _catalog_version})
 
     except Exception as e:
         print(f"Chatbot API Error: {e}")
         return jsonify({'error': 'Failed to process request'}), 500
 
 
-def generate_smart_fallback(message, context, available_books, user_wishlist=None):
+def _chatbot_completion(system_prompt, message):
+    completion = HF_CLIENT.chat.completions.create(
+        model=HF_MODEL,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": message}
+        ],
+        max_tokens=500,
+        temperature=0.7
+    )
+    return completion.choices[0].message.content.strip()
+
+
+def generate_smart_fallback(message, context, catalog, user_wishlist=None, matcher=None, get_similar_index=None):
     """Generate a deterministic fallback response when LLM is unavailable.
 
+    `catalog` is a CatalogSnapshot; only books with stock are suggested.
+    `matcher` is a TitleMatcher over the catalog; one is built if not
+    given. With `get_similar_index`, asking for something like a named
+    book recommends its nearest neighbours; the index is only fetched
+    (and built, if need be) for those requests.
+
     Returns a dict: {message: str, recommended_books: [ids], action: optional}
     """
     user_wishlist = user_wishlist or []
+    in_stock = catalog.in_stock()
+    matcher = matcher or TitleMatcher(catalog)
     msg = "I'm sorry, I couldn't reach the recommendation engine right now."
     recommended = []
     action = 'none'
 
     # Simple keyword-based recommendations
     if 'recommend' in message or 'suggest' in message or 'something to read' in message:
-        # recommend top 3 by stock
-        sorted_books = sorted(available_books, key=lambda b: int(
-            b.get('stock', 0)), reverse=True)
+        mentioned = [bid for bid in matcher.match_books(
+            message) if catalog.is_available(bid)]
+        if mentioned and get_similar_index is not None:
+            # "something like <title>": nearest neighbours of that book
+            similar = get_similar_index().similar(mentioned[0], 10)
+            picks = [bid for bid, _ in similar
+                     if catalog.is_available(bid) and bid not in mentioned]
+            sorted_books = [catalog.get(bid) for bid in picks]
+        else:
+            # narrow to any genres the user mentioned, then top 3 by stock
+            genres = set(matcher.match_genres(message))
+            candidates = catalog.matching(
+                'genre', genres, in_stock) if genres else in_stock
+            sorted_books = catalog.rows(catalog.top_stock(candidates, 3))
         for b in sorted_books[:3]:
             try:
                 bid = b.get('id')
@@ -1566,15 +2520,9 @@ def generate_smart_fallback(message, context, available_books, user_wishlist=Non
             titles = [b.get('title') for b in sorted_books[:3]]
             msg = f"I recommend: {', '.join(titles)}. Want me to add any to your wishlist?"
     elif 'add to wishlist' in message or 'add to my wishlist' in message or 'wishlist' in message:
-        # try to find a book title in message
-        for b in available_books:
-            if b.get('title') and b['title'].lower() in message:
-                try:
-                    bid = b.get('id')
-                    if bid is not None:
-                        recommended.append(str(bid))
-                except Exception:
-                    pass
+        # find every book title mentioned in the message in a single pass
+        recommended = [bid for bid in matcher.match_books(
+            message) if catalog.is_available(bid)]
         if recommended:
             action = 'add_to_wishlist'
             msg = f"Added {len(recommended)} book(s) to your wishlist (local simulation)."
@@ -1597,16 +2545,13 @@ def chatbot_add_to_wishlist():
         if not isinstance(book_ids, list):
             return jsonify({'error': 'book_ids must be a list'}), 400
 
-        wishlist = session.get('wishlist', [])
-        added = []
-        for bid in book_ids:
-            # store ids as strings
-            bid = str(bid)
-            if bid not in wishlist:
-                wishlist.append(bid)
-                added.append(bid)
+        user = session.get('user')
+        if not user:
+            return jsonify({'error': 'Please sign in'}), 401
 
-        session['wishlist'] = wishlist
+        # store ids as strings
+        added = [bid for bid in dict.fromkeys(str(b) for b in book_ids)
+                 if _wishlist_add(user['email'], bid) is not None]
 
         response_msg = None
         if not suppress_confirmation:
@@ -1618,31 +2563,242 @@ def chatbot_add_to_wishlist():
         return jsonify({'error': 'Failed to add to wishlist'}), 500
 
 
+@app.route('/api/book/<book_id>/similar', methods=['GET'])
+def get_similar_books(book_id):
+    try:
+        k = min(max(request.args.get('k', 5, type=int), 1), 50)
+        index = _get_similar_index()
+        if str(book_id) not in index.rows:
+            return jsonify({'error': 'Book not found'}), 404
+
+        matches = index.similar(book_id, k)
+        scores = dict(matches)
+        similar = []
+        for book in _batch_get_books([bid for bid, _ in matches]):
+            similar.append({
+                'id': str(book.get('id')),
+                'title': book.get('title'),
+                'author': book.get('author'),
+                'price': float(book.get('price', 0)),
+                'genre': book.get('genre', 'Unknown'),
+                'cover_url': book.get('cover_url', ''),
+                'stock': int(book.get('stock', 0) or 0),
+                'score': round(scores[str(book.get('id'))], 4)
+            })
+
+        return jsonify({'book_id': str(book_id), 'similar': similar})
+    except Exception as e:
+        print(f"Get similar books error: {e}")
+        return jsonify({'error': 'Failed to retrieve similar books'}), 500
+
+
+@app.route('/api/book/<book_id>/also-bought', methods=['GET'])
+def get_also_bought(book_id):
+    try:
+        k = min(max(request.args.get('k', 5, type=int), 1), 50)
+        item = recommendations_table.get_item(
+            Key={'id': str(book_id)}).get('Item', {})
+        ids = list(item.get('also_bought', []))[:k]
+        counts = dict(zip(ids, item.get('counts', [])))
+
+        books = []
+        for book in _batch_get_books(ids):
+            bid = str(book.get('id'))
+            books.append({
+                'id': bid,
+                'title': book.get('title'),
+                'author': book.get('author'),
+                'price': float(book.get('price', 0)),
+                'genre': book.get('genre', 'Unknown'),
+                'cover_url': book.get('cover_url', ''),
+                'stock': int(book.get('stock', 0) or 0),
+                'times_bought_together': int(counts.get(bid, 0))
+            })
+
+        return jsonify({'book_id': str(book_id), 'also_bought': books})
+    except Exception as e:
+        print(f"Get also-bought error: {e}")
+        return jsonify({'error': 'Failed to retrieve recommendations'}), 500
+
+
 @app.route('/api/book/<book_id>', methods=['GET'])
 def get_book_details(book_id):
     try:
-        response = books_table.scan()
-        all_books = response.get('Items', [])
-        # compare ids as strings
-        book = next((b for b in all_books if str(
-            b.get('id', '')) == str(book_id)), None)
+        book = books_table.get_item(Key={'id': str(book_id)}).get('Item')
         if not book:
             return jsonify({'error': 'Book not found'}), 404
 
-        return jsonify({
-            'id': str(book.get('id')),
-            'title': book.get('title'),
-            'author': book.get('author'),
-            'price': float(book.get('price', 0)),
-            'genre': book.get('genre', 'Unknown'),
-            'summary': book.get('summary', ''),
-            'cover_url': book.get('cover_url', '')
-        })
+        details = _book_json(book, ('id', 'title', 'author', 'price', 'genre',
+                                    'summary', 'cover_url'))
+        details.setdefault('genre', 'Unknown')
+        return jsonify(details)
     except Exception as e:
         print(f"Get book details error: {e}")
         return jsonify({'error': 'Failed to retrieve book'}), 500
 
 
+def _json_response(payload):
+    """Compact JSON with a weak ETag and gzip/brotli when the client accepts it.
+
+    The ETag hashes the uncompressed body, so a client revalidating with
+    If-None-Match gets a bodyless 304 until the data changes.
+    """
+    body = json.dumps(payload, separators=(',', ':'), sort_keys=True).encode()
+    etag = hashlib.sha1(body).hexdigest()
+    if request.if_none_match.contains_weak(etag):
+        resp = Response(status=304)
+    else:
+        resp = Response(body, mimetype='application/json')
+        if len(body) >= JSON_COMPRESS_MIN_BYTES:
+            accepted = request.accept_encodings
+            if brotli is not None and accepted['br']:
+                resp.set_data(brotli.compress(body, quality=5))
+                resp.headers['Content-Encoding'] = 'br'
+            elif accepted['gzip']:
+                resp.set_data(gzip.compress(body, compresslevel=6))
+                resp.headers['Content-Encoding'] = 'gzip'
+    resp.set_etag(etag, weak=True)
+    resp.vary.add('Accept-Encoding')
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp
+
+
+def _book_filters(args):
+    """FilterExpression for ?genre=&min_price=&max_price=, or None."""
+    conditions = []
+    genre = args.get('genre')
+    if genre:
+        conditions.append(Attr('genre').eq(genre))
+    for name, op in (('min_price', 'gte'), ('max_price', 'lte')):
+        value = args.get(name)
+        if value:
+            try:
+                conditions.append(getattr(Attr('price'), op)(Decimal(value)))
+            except ArithmeticError:
+                raise ValueError(f'{name} must be a number')
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def _books_page(limit, cursor=None, fields=None, filters=None):
+    """Return (books, next_cursor) for one page of a filtered Books scan.
+
+    A filtered scan page can come back short, so pages are read until
+    `limit` books match or BOOKS_SCAN_BUDGET items have been read; the
+    cursor is then the id of the last book returned (or read), which Scan
+    accepts as ExclusiveStartKey. A short page with a cursor is not the end.
+    """
+    kwargs = {'Limit': limit}
+    if fields:
+        names = {f'#f{i}': f for i, f in enumerate(fields)}
+        kwargs.update(ProjectionExpression=', '.join(names),
+                      ExpressionAttributeNames=names)
+    if filters is not None:
+        kwargs['FilterExpression'] = filters
+    if cursor:
+        kwargs['ExclusiveStartKey'] = {'id': cursor}
+
+    books = []
+    scanned = 0
+    while True:
+        if filters is not None:
+            kwargs['Limit'] = min(max(limit, 100), BOOKS_SCAN_BUDGET - scanned)
+        resp = books_table.scan(**kwargs)
+        books.extend(resp.get('Items', []))
+        scanned += resp.get('ScannedCount', 0)
+        last_key = resp.get('LastEvaluatedKey')
+        if len(books) >= limit or not last_key or scanned >= BOOKS_SCAN_BUDGET:
+            break
+        kwargs['ExclusiveStartKey'] = last_key
+
+    if len(books) > limit:
+        books = books[:limit]
+        return books, _encode_cursor({'id': str(books[-1]['id'])})
+    if last_key:
+        return books, _encode_cursor({'id': str(last_key['id'])})
+    return books, None
+
+
+@app.route('/api/catalog/changes', methods=['GET'])
+def get_catalog_changes():
+    """Catalog deltas after ?since=<version>, oldest first (?limit=, max 1000).
+
+    Poll with the returned `version` while `has_more` is set. `reset` means
+    the requested history has expired: reload via /api/books and continue
+    from `version`.
+    """
+    since = request.args.get('since', type=int)
+    if since is None or since < 0:
+        return jsonify({'error': 'since must be a non-negative integer'}), 400
+    limit = min(max(request.args.get('limit', 500, type=int), 1), 1000)
+
+    try:
+        return _json_response(catalog_feed.changes(since, limit))
+    except Exception as e:
+        print(f"Catalog changes error: {e}")
+        return jsonify({'error': 'Failed to retrieve catalog changes'}), 500
+
+
+@app.route('/api/books', methods=['GET'])
+def get_books():
+    """Catalog JSON API.
+
+    ?ids=1,2,3      those books, in one BatchGetItem
+    otherwise       a page of the catalog: ?limit=&cursor=&genre=&min_price=&max_price=
+                    A filtered page may be short or empty; keep following
+                    next_cursor until it is null.
+    Both accept ?fields=title,price,... to return only those fields.
+    """
+    fields = [f for f in request.args.get('fields', '').split(',') if f]
+    unknown = set(fields) - set(BOOK_API_FIELDS)
+    if unknown:
+        return jsonify({'error': f"Unknown fields: {', '.join(sorted(unknown))}"}), 400
+    fields = list(dict.fromkeys(['id', *fields])) if fields else list(BOOK_API_FIELDS)
+
+    ids = [i.strip() for i in request.args.get('ids', '').split(',') if i.strip()]
+    if len(ids) > 100:
+        return jsonify({'error': 'At most 100 ids per request'}), 400
+
+    if ids:
+        try:
+            books = _batch_get_books(ids, fields)
+        except Exception as e:
+            print(f"Get books error: {e}")
+            return jsonify({'error': 'Failed to retrieve books'}), 500
+
+        found = {str(b.get('id')) for b in books}
+        return _json_response({
+            'catalog_version': _catalog_version,
+            'books': [_book_json(b, fields) for b in books],
+            'missing': [i for i in ids if i not in found]
+        })
+
+    limit = min(max(request.args.get('limit', 24, type=int), 1), 100)
+    cursor = None
+    if request.args.get('cursor'):
+        cursor = (_decode_cursor(request.args['cursor']) or {}).get('id')
+        if not cursor:
+            return jsonify({'error': 'Invalid cursor'}), 400
+    try:
+        filters = _book_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        books, next_cursor = _books_page(limit, cursor, fields, filters)
+    except Exception as e:
+        print(f"List books error: {e}")
+        return jsonify({'error': 'Failed to retrieve books'}), 500
+
+    return _json_response({
+        'catalog_version': _catalog_version,
+        'books': [_book_json(b, fields) for b in books],
+        'next_cursor': next_cursor
+    })
+
+
 def generate_fallback_response(message, context, available_books, user_orders):
     """Generate response using simple pattern matching"""
     # Use the passed `available_books` and safe context lookups
@@ -1696,14 +2852,14 @@ def generate_fallback_response(message, context, available_books, user_orders):
 
 @app.context_processor
 def cart_context():
-    cart = session.get('cart', {})
-    count = sum(int(q) for q in cart.values())
-    wishlist = session.get('wishlist', [])
-    wishlist_ids = set(wishlist)
+    user = session.get('user')
+    if not user:
+        return {'cart_count': 0, 'wishlist_ids': set()}
 
+    state = _user_state(user['email'])
     return {
-        'cart_count': count,
-        'wishlist_ids': wishlist_ids
+        'cart_count': state['cart_count'],
+        'wishlist_ids': state['wishlist']
     }
 
 
@@ -0,0 +1,115 @@
+"""Load-test /api/chatbot and report throughput and tail latency.
+
+Typical run against the mock inference server:
+
+    python mock_inference_server.py --latency lognormal --latency-ms 800 --jitter-ms 400
+    HF_BASE_URL=http://127.0.0.1:8080 CHATBOT_RATE_PER_MIN=100000 CHATBOT_BURST=100000 \\
+        python test_aws_app.py
+    python bench_chatbot.py --concurrency 32 --requests 1000
+
+Pass --unique to give every request a distinct prompt (defeats request
+coalescing); by default prompts are drawn from a small fixed set.
+"""
+import argparse
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+DEFAULT_PROMPTS = [
+    'recommend a fiction book',
+    'suggest something to read',
+    'do you have any sci-fi?',
+    'add the great gatsby to my wishlist',
+    'what programming books do you have?',
+]
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def run(url, total, concurrency, prompts, unique=False, timeout=30):
+    local = threading.local()
+    latencies = []
+    statuses = Counter()
+    sources = Counter()
+    lock = threading.Lock()
+
+    def one(i):
+        sess = getattr(local, 'session', None)
+        if sess is None:
+            sess = local.session = requests.Session()
+        message = random.choice(prompts)
+        if unique:
+            message = f"{message} #{i}"
+        start = time.perf_counter()
+        try:
+            resp = sess.post(url, json={'message': message}, timeout=timeout)
+            status = resp.status_code
+            try:
+                source = resp.json().get('source', '-')
+            except ValueError:
+                source = '-'
+        except requests.RequestException:
+            status, source = 'conn-error', '-'
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            statuses[status] += 1
+            sources[source] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': total,
+        'concurrency': concurrency,
+        'wall_seconds': wall,
+        'throughput': total / wall if wall else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p90_ms': percentile(latencies, 90) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'max_ms': (latencies[-1] if latencies else 0) * 1000,
+        'statuses': dict(statuses),
+        'sources': dict(sources),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000/api/chatbot')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--unique', action='store_true',
+                        help='make every prompt distinct')
+    parser.add_argument('--timeout', type=float, default=30)
+    args = parser.parse_args()
+
+    result = run(args.url, args.requests, args.concurrency,
+                 DEFAULT_PROMPTS, unique=args.unique, timeout=args.timeout)
+
+    print(f"Requests:     {result['requests']} @ concurrency {result['concurrency']}")
+    print(f"Wall time:    {result['wall_seconds']:.2f}s")
+    print(f"Throughput:   {result['throughput']:.1f} req/s")
+    print(f"Latency p50:  {result['p50_ms']:.1f} ms")
+    print(f"Latency p90:  {result['p90_ms']:.1f} ms")
+    print(f"Latency p99:  {result['p99_ms']:.1f} ms")
+    print(f"Latency max:  {result['max_ms']:.1f} ms")
+    print(f"Statuses:     {result['statuses']}")
+    print(f"Sources:      {result['sources']}")
+
+
+if __name__ == '__main__':
+    main()
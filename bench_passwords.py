@@ -0,0 +1,66 @@
+"""Measure password verification throughput (logins/s per core).
+
+Compares hashing methods in-process, with no web server or DynamoDB in the
+loop, so the numbers isolate the cost a login pays in PasswordPolicy.verify:
+
+    python bench_passwords.py --methods scrypt pbkdf2:sha256:600000 --workers 4
+
+Use the result to pick PASSWORD_HASH_METHOD and PASSWORD_HASH_WORKERS.
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import generate_password_hash
+
+from password_policy import PasswordPolicy
+
+DEFAULT_METHODS = ['scrypt', 'pbkdf2:sha256:600000', 'pbkdf2:sha256:100000']
+
+
+def run(method, total, workers, concurrency):
+    policy = PasswordPolicy(method, workers=workers)
+    pwhash = generate_password_hash('correct horse', method=method)
+    # start the worker processes before timing
+    policy.verify(pwhash, 'correct horse')
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(
+            lambda _: policy.verify(pwhash, 'correct horse')[0], range(total)))
+    wall = time.perf_counter() - started
+    policy.shutdown()
+
+    throughput = total / wall if wall else 0.0
+    return {
+        'method': policy.method,
+        'logins': total,
+        'failures': results.count(False),
+        'wall_seconds': wall,
+        'throughput': throughput,
+        'per_core': throughput / workers,
+        'ms_per_login': wall * 1000 * workers / total if total else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--methods', nargs='+', default=DEFAULT_METHODS)
+    parser.add_argument('--logins', type=int, default=50)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='hashing processes')
+    parser.add_argument('--concurrency', type=int, default=None,
+                        help='simulated request threads (default: 2x workers)')
+    args = parser.parse_args()
+
+    concurrency = args.concurrency or args.workers * 2
+    print(f"{'method':<28} {'logins/s':>9} {'per core':>9} {'ms/login':>9}")
+    for method in args.methods:
+        result = run(method, args.logins, args.workers, concurrency)
+        print(f"{result['method']:<28} {result['throughput']:>9.1f} "
+              f"{result['per_core']:>9.1f} {result['ms_per_login']:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
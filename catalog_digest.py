@@ -0,0 +1,110 @@
+"""Compact catalog digest for chatbot prompts.
+
+The chatbot used to embed `json.dumps(books, indent=2)` in every system
+prompt. The digest is one pipe-separated line per in-stock book with the
+summary truncated, which is built once per catalog version and reused.
+
+Run this module directly to compare prompt sizes on a synthetic catalog of
+--books N entries.
+"""
+import argparse
+import json
+import re
+
+DIGEST_COLUMNS = 'id|title|author|genre|price|stock|summary'
+SUMMARY_CHARS = 120
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def _field(value):
+    return ' '.join(str(value or '').replace('|', '/').split())
+
+
+def _truncate(text, limit=SUMMARY_CHARS):
+    text = _field(text)
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(' ', 1)[0] + '...'
+
+
+def build_digest(books):
+    """Return the digest text for the in-stock `books`."""
+    lines = [DIGEST_COLUMNS]
+    for b in books:
+        try:
+            stock = int(b.get('stock', 0) or 0)
+        except (TypeError, ValueError):
+            stock = 0
+        if stock <= 0:
+            continue
+        price = float(b.get('price', 0) or 0)
+        lines.append('|'.join([
+            _field(b.get('id')),
+            _field(b.get('title')),
+            _field(b.get('author')),
+            _field(b.get('genre') or 'Unknown'),
+            f"{price:.2f}",
+            str(stock),
+            _truncate(b.get('summary')),
+        ]))
+    return '\n'.join(lines)
+
+
+def legacy_context(books):
+    """The pre-digest prompt payload, kept for size comparisons."""
+    books_context = []
+    for b in books:
+        if int(b.get('stock', 0) or 0) <= 0:
+            continue
+        books_context.append({
+            'id': str(b.get('id')),
+            'title': b.get('title', ''),
+            'author': b.get('author', ''),
+            'genre': b.get('genre', 'Unknown'),
+            'price': float(b.get('price', 0) or 0),
+            'stock': int(b.get('stock', 0) or 0),
+            'summary': b.get('summary', '')
+        })
+    return json.dumps(books_context, indent=2)
+
+
+def estimate_tokens(text):
+    """Rough token count: words and punctuation marks, as BPE tokenizers split them."""
+    return len(_TOKEN_RE.findall(text))
+
+
+def _synthetic_books(n):
+    summary = ('A sweeping story of ambition, loss and second chances that '
+               'follows three generations of a family across two continents '
+               'and a century of change.')
+    return [{
+        'id': f"book-{i}",
+        'title': f"Sample Title {i}",
+        'author': f"Author {i % 500}",
+        'genre': ['Fiction', 'Sci-Fi', 'Fantasy', 'Programming', 'History'][i % 5],
+        'price': 9.99 + i % 20,
+        'stock': 1 + i % 7,
+        'summary': summary,
+    } for i in range(n)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare prompt sizes.')
+    parser.add_argument('--books', type=int, default=500,
+                        help='number of synthetic books')
+    args = parser.parse_args()
+
+    books = _synthetic_books(args.books)
+
+    before = legacy_context(books)
+    after = build_digest(books)
+    tb, ta = estimate_tokens(before), estimate_tokens(after)
+    print(f"Books:            {len(books)}")
+    print(f"indent=2 JSON:    {len(before):>9} chars  ~{tb:>8} tokens")
+    print(f"Compact digest:   {len(after):>9} chars  ~{ta:>8} tokens")
+    print(f"Token reduction:  {100.0 * (tb - ta) / max(tb, 1):.1f}%")
+
+
+if __name__ == '__main__':
+    main()
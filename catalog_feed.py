@@ -0,0 +1,171 @@
+"""Versioned change log of the Books catalog.
+
+Every write to BookBazaar_Books appends one entry to
+BookBazaar_CatalogChanges:
+
+    feed    = 'catalog'        (partition key)
+    version = 1, 2, 3, ...     (sort key)
+
+holding `op` (insert | update | delete | stock), `book_id` and, except for
+deletes, `book` with the fields that changed. A client that has applied
+version N reads the entries with version > N, in order, and is then at the
+version of the last one.
+
+Versions come from an atomic ADD on a separate counter item
+(feed = 'catalog#counter'), so writers never race on the newest entry and
+the counter never expires: versions keep counting up however long the
+catalog goes without a write. Each entry is then put once and expires
+RETENTION_DAYS after it was written (DynamoDB TTL on `expires_at`).
+
+A version is taken before its entry lands, so a reader can briefly see
+version 8 without 7. changes() stops at such a gap and the reader picks up
+from there on its next poll. A gap that is still there GAP_GRACE seconds
+later is an entry that expired or was never written (its writer failed
+after taking the version), and the reader is told to resync from scratch.
+"""
+import time
+
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+from exports import plain
+
+CATALOG_CHANGES_TABLE = 'BookBazaar_CatalogChanges'
+FEED = 'catalog'
+COUNTER_KEY = {'feed': FEED + '#counter', 'version': 0}
+RETENTION_DAYS = 7
+# how long a missing version may be in flight before readers give up on it
+GAP_GRACE = 10
+OPS = ('insert', 'update', 'delete', 'stock')
+
+
+def _is_condition_failure(e):
+    return e.response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException'
+
+
+class CatalogFeed:
+    def __init__(self, table):
+        self.table = table
+
+    def _newest_entry(self):
+        resp = self.table.query(
+            KeyConditionExpression=Key('feed').eq(FEED),
+            ScanIndexForward=False, Limit=1, ConsistentRead=True)
+        items = resp.get('Items', [])
+        return int(items[0]['version']) if items else 0
+
+    def _counter(self):
+        """(last version handed out, when), from the counter item."""
+        item = self.table.get_item(
+            Key=COUNTER_KEY, ConsistentRead=True).get('Item')
+        if item is None:
+            # feed written before the counter existed
+            return self._newest_entry(), 0
+        return int(item['head']), int(item.get('at', 0))
+
+    def latest(self):
+        """The last version handed out (0 for an empty feed).
+
+        Its entry, or one just below it, may still be on its way.
+        """
+        return self._counter()[0]
+
+    def _allocate(self):
+        """Take the next version with one atomic ADD on the counter."""
+        for _ in range(2):
+            try:
+                resp = self.table.update_item(
+                    Key=COUNTER_KEY,
+                    UpdateExpression='ADD #head :one SET #at = :now',
+                    ConditionExpression='attribute_exists(#head)',
+                    ExpressionAttributeNames={'#head': 'head', '#at': 'at'},
+                    ExpressionAttributeValues={
+                        ':one': 1, ':now': int(time.time())},
+                    ReturnValues='UPDATED_NEW')
+                return int(resp['Attributes']['head'])
+            except ClientError as e:
+                if not _is_condition_failure(e):
+                    raise
+            # first write since the counter was introduced: start it at the
+            # newest entry so versions carry on from there
+            try:
+                self.table.put_item(
+                    Item={**COUNTER_KEY, 'head': self._newest_entry(),
+                          'at': int(time.time())},
+                    ConditionExpression='attribute_not_exists(#head)',
+                    ExpressionAttributeNames={'#head': 'head'})
+            except ClientError as e:
+                if not _is_condition_failure(e):
+                    raise
+        raise RuntimeError('Catalog change counter could not be created')
+
+    def record(self, op, book_id, book=None):
+        """Append a change and return its version.
+
+        One counter ADD and one put; raises if either fails. A version
+        taken without its entry shows up as a gap that makes readers
+        resync, never as a change they silently skip.
+        """
+        if op not in OPS:
+            raise ValueError(f"unknown catalog op {op!r}")
+        version = self._allocate()
+        now = int(time.time())
+        item = {
+            'feed': FEED,
+            'version': version,
+            'op': op,
+            'book_id': str(book_id),
+            'at': now,
+            'expires_at': now + RETENTION_DAYS * 86400
+        }
+        if book:
+            item['book'] = book
+        self.table.put_item(
+            Item=item, ConditionExpression='attribute_not_exists(version)')
+        return item['version']
+
+    def changes(self, since, limit=500):
+        """Entries after `since`, oldest first.
+
+        Returns {version, changes, has_more, reset}. `version` is the version
+        the reader is at after applying `changes`; it can stop short of
+        latest() while an entry is still being written. With `reset` set,
+        entries after `since` are gone: reload the catalog and continue from
+        `version`.
+        """
+        resp = self.table.query(
+            KeyConditionExpression=Key('feed').eq(FEED) & Key('version').gt(since),
+            Limit=limit, ConsistentRead=True)
+        now = time.time()
+        changes = []
+        blocked = False
+        for i in resp.get('Items', []):
+            version = int(i['version'])
+            expected = changes[-1]['version'] + 1 if changes else since + 1
+            if version != expected:
+                # the entry after a gap was written after the missing one's
+                # version was taken; give that writer GAP_GRACE to finish
+                if now - int(i['at']) >= GAP_GRACE:
+                    return self._reset()
+                blocked = True
+                break
+            changes.append({'version': version, 'op': i['op'],
+                            'book_id': i['book_id'],
+                            'book': plain(i.get('book', {})),
+                            'at': int(i['at'])})
+
+        if not changes and not blocked:
+            head, at = self._counter()
+            # behind a recreated feed, or the next entry never arrived
+            if head < since or (head > since and now - at >= GAP_GRACE):
+                return self._reset()
+        return {
+            'version': changes[-1]['version'] if changes else since,
+            'changes': changes,
+            'has_more': not blocked and 'LastEvaluatedKey' in resp,
+            'reset': False
+        }
+
+    def _reset(self):
+        return {'version': self.latest(), 'changes': [],
+                'has_more': False, 'reset': True}
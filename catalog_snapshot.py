@@ -0,0 +1,457 @@
+"""Read-only catalog snapshot shared by every worker through mmap.
+
+One worker writes the catalog, column by column, into a single file:
+
+    b'BBSNAP01' | header length (uint32) | JSON header | padding | columns
+
+`id` is a sorted fixed-width byte array (lookups are a binary search),
+`price` and `stock` are raw little-endian arrays, and each text column is a
+uint64 offset array plus one UTF-8 blob. Workers map the file read-only and
+the arrays are numpy views on the mapping, so the catalog sits in the page
+cache once per host instead of once per worker. Hot paths read the columns
+(stock masks, lookups by id) rather than turning rows into dicts.
+
+The snapshot follows the catalog change feed instead of rescanning Books:
+
+* stock-only changes (checkouts) patch a copy of the stock column into a
+  small overlay file, `stock-<version>.bin`, mapped over the base snapshot;
+* inserts, updates and deletes re-read just the books they name and write
+  a new base snapshot;
+* a full scan only happens when there is no snapshot yet or the feed no
+  longer reaches back to it.
+
+Files are named by catalog version and never change once written. CURRENT
+names the base snapshot, the stock overlay and the version they make up,
+and is swapped with os.replace, so a reader sees the old catalog or the new
+one, never a mix. While one worker updates the files, the others keep
+serving the snapshot they have.
+
+Build one ahead of starting the workers with:
+
+    python catalog_snapshot.py --dir /var/run/bookbazaar-catalog
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from contextlib import contextmanager
+
+import boto3
+import numpy as np
+
+from catalog_feed import CATALOG_CHANGES_TABLE, CatalogFeed
+from dynamo_utils import scan_all
+
+try:
+    import fcntl  # serializes builds between workers; absent on Windows
+except ImportError:
+    fcntl = None
+
+MAGIC = b'BBSNAP01'
+ALIGN = 8
+CURRENT = 'CURRENT'
+# older files kept so a worker that just read CURRENT can still open them
+KEEP = 3
+# feed entries replayed at most before a full rescan is cheaper
+MAX_DELTA = 5000
+
+NUMERIC_COLUMNS = {'price': '<f8', 'stock': '<i8'}
+TEXT_COLUMNS = ('title', 'author', 'genre', 'summary', 'cover_url',
+                'seller_name', 'seller_email', 'created_at')
+
+
+def default_directory():
+    return os.path.join(tempfile.gettempdir(), 'bookbazaar-catalog')
+
+
+def _text_column(values):
+    encoded = [v.encode() for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype='<u8')
+    np.cumsum([len(v) for v in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b''.join(encoded), dtype='u1')
+
+
+def encode_snapshot(books, version):
+    """Return the snapshot file contents for `books` at catalog `version`."""
+    books = sorted((b for b in books if b.get('id') is not None),
+                   key=lambda b: str(b['id']))
+    ids = [str(b['id']).encode() for b in books]
+    arrays = [('id', np.array(ids, dtype=f"S{max(map(len, ids), default=1)}"))]
+    arrays.append(('price', np.array(
+        [float(b.get('price') or 0) for b in books], dtype=NUMERIC_COLUMNS['price'])))
+    arrays.append(('stock', np.array(
+        [int(b.get('stock') or 0) for b in books], dtype=NUMERIC_COLUMNS['stock'])))
+    for name in TEXT_COLUMNS:
+        offsets, blob = _text_column([str(b.get(name) or '') for b in books])
+        arrays.append((f"{name}.offsets", offsets))
+        arrays.append((f"{name}.blob", blob))
+
+    columns = {}
+    offset = 0
+    for name, array in arrays:
+        columns[name] = {'dtype': array.dtype.str, 'offset': offset,
+                         'count': len(array)}
+        offset += array.nbytes + -array.nbytes % ALIGN
+    header = json.dumps({'version': version, 'count': len(books),
+                         'columns': columns}).encode()
+    parts = [MAGIC, struct.pack('<I', len(header)), header]
+    parts.append(b'\0' * (-(len(MAGIC) + 4 + len(header)) % ALIGN))
+    for _, array in arrays:
+        parts.append(array.tobytes())
+        parts.append(b'\0' * (-array.nbytes % ALIGN))
+    return b''.join(parts)
+
+
+def _write_file(directory, name, data):
+    """Write `data` to directory/name atomically; returns the path."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    return path
+
+
+def _set_current(directory, version, base, stock=None):
+    _write_file(directory, CURRENT, json.dumps(
+        {'version': version, 'base': base, 'stock': stock}).encode())
+    _remove_old(directory)
+
+
+def write_snapshot(books, version, directory):
+    """Write `books` as snapshot `version`, make it current and return its path."""
+    name = f"catalog-{version:012d}.snap"
+    path = _write_file(directory, name, encode_snapshot(books, version))
+    _set_current(directory, version, name)
+    return path
+
+
+def write_stock(snapshot, stock, version, directory):
+    """Make `stock` (one value per row of `snapshot`) current at `version`."""
+    name = f"stock-{version:012d}.bin"
+    _write_file(directory, name, np.asarray(stock, dtype='<i8').tobytes())
+    _set_current(directory, version, os.path.basename(snapshot.path), name)
+
+
+def _remove_old(directory):
+    # a worker that still maps an unlinked file keeps reading it
+    for prefix, suffix in (('catalog-', '.snap'), ('stock-', '.bin')):
+        names = sorted(n for n in os.listdir(directory)
+                       if n.startswith(prefix) and n.endswith(suffix))
+        for name in names[:-KEEP]:
+            try:
+                os.unlink(os.path.join(directory, name))
+            except OSError:
+                pass
+
+
+class CatalogSnapshot:
+    """A snapshot in a read-only buffer. Iterating yields book dicts."""
+
+    def __init__(self, buffer, path=None):
+        self.path = path
+        self._buffer = buffer
+        if bytes(buffer[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{path or 'buffer'} is not a catalog snapshot")
+        (header_len,) = struct.unpack_from('<I', buffer, len(MAGIC))
+        start = len(MAGIC) + 4
+        header = json.loads(bytes(buffer[start:start + header_len]))
+        base = start + header_len
+        base += -base % ALIGN
+
+        self.version = header['version']
+        self.count = header['count']
+        # zero-copy views on the buffer
+        self._columns = {
+            name: np.frombuffer(buffer, dtype=col['dtype'], count=col['count'],
+                                offset=base + col['offset'])
+            for name, col in header['columns'].items()
+        }
+        # derived per base file and shared with its stock overlays
+        self._memo = {}
+
+    @classmethod
+    def open(cls, path):
+        with open(path, 'rb') as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), path)
+
+    @classmethod
+    def from_books(cls, books, version=0):
+        """An in-memory snapshot, for when no shared one is available."""
+        return cls(encode_snapshot(books, version))
+
+    def with_stock(self, path, version):
+        """This snapshot with the stock column mapped from an overlay file."""
+        if os.path.getsize(path):
+            with open(path, 'rb') as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            buffer = b''  # empty catalog; mmap refuses empty files
+        stock = np.frombuffer(buffer, dtype=NUMERIC_COLUMNS['stock'])
+        if len(stock) != self.count:
+            raise ValueError(f"{path} does not match {self.path}")
+        overlay = object.__new__(CatalogSnapshot)
+        overlay.__dict__.update(self.__dict__)
+        overlay._columns = dict(self._columns, stock=stock)
+        overlay.version = version
+        return overlay
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self.row(i)
+
+    def column(self, name):
+        """The read-only numpy array for 'id', 'price' or 'stock'."""
+        return self._columns[name]
+
+    def text(self, name, i):
+        offsets = self._columns[f"{name}.offsets"]
+        blob = self._columns[f"{name}.blob"]
+        return blob[offsets[i]:offsets[i + 1]].tobytes().decode()
+
+    def row(self, i):
+        book = {'id': self._columns['id'][i].decode(),
+                'price': float(self._columns['price'][i]),
+                'stock': int(self._columns['stock'][i])}
+        for name in TEXT_COLUMNS:
+            value = self.text(name, i)
+            if value:
+                book[name] = value
+        return book
+
+    def rows(self, indices):
+        return [self.row(i) for i in indices]
+
+    def index_of(self, book_id):
+        ids = self._columns['id']
+        key = str(book_id).encode()
+        i = int(np.searchsorted(ids, key))
+        return i if i < self.count and ids[i] == key else None
+
+    def get(self, book_id):
+        i = self.index_of(book_id)
+        return None if i is None else self.row(i)
+
+    def in_stock(self):
+        """Boolean mask of the rows with stock left."""
+        return self._columns['stock'] > 0
+
+    def is_available(self, book_id):
+        i = self.index_of(book_id)
+        return i is not None and self._columns['stock'][i] > 0
+
+    def categories(self, name):
+        """(distinct values, code per row) for a text column, built once."""
+        key = ('categories', name)
+        if key not in self._memo:
+            values = [self.text(name, i) for i in range(self.count)]
+            distinct = sorted(set(values))
+            lookup = {v: c for c, v in enumerate(distinct)}
+            codes = np.array([lookup[v] for v in values], dtype=np.int32)
+            self._memo[key] = (distinct, codes)
+        return self._memo[key]
+
+    def matching(self, name, values, mask=None):
+        """Mask of rows whose `name` is one of `values` (and in `mask`)."""
+        distinct, codes = self.categories(name)
+        wanted = [c for c, v in enumerate(distinct) if v in set(values)]
+        result = np.isin(codes, wanted)
+        return result if mask is None else result & mask
+
+    def counts(self, name, mask=None):
+        """{value: rows} for a text column."""
+        distinct, codes = self.categories(name)
+        if mask is not None:
+            codes = codes[mask]
+        totals = np.bincount(codes, minlength=len(distinct))
+        return {v: int(n) for v, n in zip(distinct, totals) if n}
+
+    def top_stock(self, mask, k):
+        """Row indices of the (up to) k best-stocked rows in `mask`."""
+        rows = np.flatnonzero(mask)
+        if len(rows) > k:
+            stock = self._columns['stock'][rows]
+            rows = rows[np.argpartition(-stock, k - 1)[:k]]
+        return rows[np.argsort(-self._columns['stock'][rows], kind='stable')].tolist()
+
+
+@contextmanager
+def _build_lock(directory, blocking=True):
+    """Hold the host-wide build lock; yields False if `blocking` is off and
+    another process has it."""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, 'build.lock'), 'a') as f:
+        if fcntl:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                yield False
+                return
+        yield True
+
+
+class SnapshotStore:
+    """This process's view of the current snapshot in `directory`.
+
+    `scan()` yields every book, `changes(since, limit)` reads the catalog
+    feed and `fetch(ids)` returns the current items for some book ids.
+    """
+
+    def __init__(self, directory=None, scan=None, changes=None, fetch=None):
+        self.directory = directory or default_directory()
+        self.scan = scan
+        self.changes = changes
+        self.fetch = fetch
+        self._snapshot = None
+        self._base = None
+        self._current_stat = None
+        self._verified = False
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        """Map what CURRENT names if it changed since the last look."""
+        current = os.path.join(self.directory, CURRENT)
+        for _ in range(2):
+            try:
+                st = os.stat(current)
+                stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+                if stamp == self._current_stat:
+                    return self._snapshot
+                with open(current) as f:
+                    state = json.load(f)
+                base = self._base
+                path = os.path.join(self.directory, state['base'])
+                if base is None or base.path != path:
+                    base = CatalogSnapshot.open(path)
+                snapshot = base
+                if state.get('stock'):
+                    snapshot = base.with_stock(
+                        os.path.join(self.directory, state['stock']), state['version'])
+            except FileNotFoundError:
+                # nothing built yet, or CURRENT moved on while we read it
+                continue
+            except (ValueError, KeyError) as e:
+                print(f"Unreadable catalog snapshot in {self.directory}: {e}")
+                return None
+            self._snapshot, self._base, self._current_stat = snapshot, base, stamp
+            return snapshot
+        return self._snapshot
+
+    def current(self, version):
+        """Return a snapshot at catalog `version` or newer.
+
+        When it has to be brought up to date and another thread or process
+        is already doing that, the snapshot in hand is returned as it is.
+        Only a process with no snapshot at all waits.
+        """
+        snapshot = self._refresh()
+        if self._usable(snapshot, version):
+            self._verified = True
+            return snapshot
+        waiting = snapshot is None
+        if not self._lock.acquire(blocking=waiting):
+            return snapshot
+        try:
+            with _build_lock(self.directory, blocking=waiting) as locked:
+                if not locked:
+                    return snapshot
+                snapshot = self._refresh()
+                if not self._usable(snapshot, version):
+                    self._update(snapshot, version)
+                    snapshot = self._refresh()
+                self._verified = True
+                return snapshot
+        finally:
+            self._lock.release()
+
+    def _usable(self, snapshot, version):
+        if snapshot is None:
+            return False
+        # the first check per process also rejects snapshots from *newer*
+        # versions, left behind by a previous run against another feed
+        if not self._verified:
+            return snapshot.version == version
+        return snapshot.version >= version
+
+    def _update(self, snapshot, version):
+        changes = None
+        if snapshot is not None and snapshot.version < version and self.changes:
+            changes = self._changes_since(snapshot.version, version)
+        if changes is None:
+            write_snapshot(self.scan(), version, self.directory)
+            return
+        if not changes:
+            # the next entry is still being written; serve what we have
+            return
+
+        reached = changes[-1]['version']
+        stock_only = all(c['op'] == 'stock' and 'stock' in c['book']
+                         for c in changes)
+        if stock_only:
+            stock = np.array(snapshot.column('stock'))
+            for c in changes:
+                i = snapshot.index_of(c['book_id'])
+                if i is not None:
+                    stock[i] = int(c['book']['stock'])
+            write_stock(snapshot, stock, reached, self.directory)
+            return
+
+        # re-read only the books that changed and merge them in
+        ids = set(c['book_id'] for c in changes)
+        fresh = {str(b['id']): b for b in self.fetch(sorted(ids))}
+        books = {b['id']: b for b in snapshot if b['id'] not in ids}
+        books.update(fresh)
+        write_snapshot(books.values(), reached, self.directory)
+
+    def _changes_since(self, since, version):
+        """Feed entries from `since` towards `version`, or None if the feed
+        cannot cover that range. The list stops short of `version` while an
+        entry is still being written."""
+        changes = []
+        while since < version:
+            page = self.changes(since, limit=1000)
+            if page['reset']:
+                return None
+            changes.extend(page['changes'])
+            if len(changes) > MAX_DELTA:
+                return None
+            if not page['has_more']:
+                break
+            since = page['version']
+        return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Build the catalog snapshot from DynamoDB.')
+    parser.add_argument('--dir', default=default_directory())
+    parser.add_argument('--region', default='us-east-1')
+    args = parser.parse_args()
+
+    dynamodb = boto3.resource('dynamodb', region_name=args.region)
+    # read the version first: the scan then includes at least its writes
+    version = CatalogFeed(dynamodb.Table(CATALOG_CHANGES_TABLE)).latest()
+    path = write_snapshot(
+        scan_all(dynamodb.Table('BookBazaar_Books'), ConsistentRead=True),
+        version, args.dir)
+    snapshot = CatalogSnapshot.open(path)
+    print(f"Wrote {len(snapshot)} books at version {version} "
+          f"({os.path.getsize(path)} bytes) -> {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""Batch job: mine "customers also bought" pairs from BookBazaar_Orders.
+
+payment() writes one order item per seller, all sharing `original_order_id`,
+so a customer's basket is the union of the sub-orders' `items`. The job:
+
+1. scans the Orders table as parallel segments in a process pool; each
+   worker spills its baskets to `shards` files, partitioned by a hash of
+   `original_order_id`, so every sub-order of a purchase meets in one shard;
+2. reduces each shard in the pool: merges its baskets and counts
+   co-occurring book pairs. Only pair counts come back to the parent;
+3. keeps the top-k neighbours per book and writes them to
+   BookBazaar_Recommendations as two compact parallel lists, deleting
+   items for books that no longer have any co-purchases.
+
+    python copurchase_job.py --workers 8 --top-k 10
+"""
+import argparse
+import heapq
+import json
+import os
+import random
+import tempfile
+import zlib
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import combinations
+
+import boto3
+
+from dynamo_utils import scan_all
+
+REGION = 'us-east-1'
+ORDERS_TABLE = 'BookBazaar_Orders'
+RECOMMENDATIONS_TABLE = 'BookBazaar_Recommendations'
+
+# very large baskets add quadratic pairs but little signal; they are
+# sampled down to this many books
+MAX_BASKET = 50
+
+
+def scan_baskets(region, segment=None, total_segments=None):
+    """Return {original_order_id: set(book_ids)} for one scan segment."""
+    table = boto3.resource('dynamodb', region_name=region).Table(ORDERS_TABLE)
+    kwargs = {'ProjectionExpression': 'id, original_order_id, #items',
+              'ExpressionAttributeNames': {'#items': 'items'}}
+    if total_segments:
+        kwargs.update(Segment=segment, TotalSegments=total_segments)
+
+    baskets = defaultdict(set)
+    for order in scan_all(table, **kwargs):
+        key = order.get('original_order_id') or order.get('id')
+        for it in order.get('items', []) or []:
+            bid = it.get('book_id') or it.get('id')
+            if bid is not None:
+                baskets[key].add(str(bid))
+    return baskets
+
+
+def _shard_of(key, shards):
+    # crc32, not hash(): it must agree across worker processes
+    return zlib.crc32(str(key).encode()) % shards
+
+
+def _shard_path(spill_dir, shard, segment):
+    return os.path.join(spill_dir, f"shard-{shard}-segment-{segment}.jsonl")
+
+
+def _scan_segment(args):
+    """Scan one segment and spill its baskets to one file per shard."""
+    region, segment, total_segments, shards, spill_dir = args
+    files = [open(_shard_path(spill_dir, shard, segment), 'w')
+             for shard in range(shards)]
+    try:
+        for key, books in scan_baskets(region, segment, total_segments).items():
+            files[_shard_of(key, shards)].write(
+                json.dumps([str(key), sorted(books)]) + '\n')
+    finally:
+        for f in files:
+            f.close()
+
+
+def _reduce_shard(args):
+    """Merge one shard's baskets; return (basket count, pair counts)."""
+    shard, segments, spill_dir = args
+    baskets = defaultdict(set)
+    for segment in range(segments):
+        with open(_shard_path(spill_dir, shard, segment)) as f:
+            for line in f:
+                key, books = json.loads(line)
+                baskets[key].update(books)
+    return len(baskets), count_pairs(baskets.items())
+
+
+def _sample(key, basket):
+    """Up to MAX_BASKET books of `basket`, chosen at random but repeatably."""
+    items = sorted(basket)
+    if len(items) <= MAX_BASKET:
+        return items
+    return random.Random(zlib.crc32(str(key).encode())).sample(items, MAX_BASKET)
+
+
+def count_pairs(baskets):
+    """Count unordered co-purchased pairs across (key, basket) pairs."""
+    pairs = Counter()
+    for key, basket in baskets:
+        if len(basket) < 2:
+            continue
+        pairs.update(combinations(sorted(_sample(key, basket)), 2))
+    return pairs
+
+
+def top_k_neighbors(pairs, k):
+    """Return {book_id: [(other_id, count), ...]} keeping the k strongest."""
+    neighbors = defaultdict(list)
+    for (a, b), count in pairs.items():
+        neighbors[a].append((count, b))
+        neighbors[b].append((count, a))
+    return {bid: [(other, count) for count, other in heapq.nlargest(k, cands)]
+            for bid, cands in neighbors.items()}
+
+
+def build(region=REGION, workers=1, segments=None, top_k=10, shards=None):
+    segments = segments or workers
+    shards = shards or workers * 4
+    n_baskets = 0
+    pairs = Counter()
+
+    with tempfile.TemporaryDirectory(prefix='copurchase-') as spill_dir:
+        scan_jobs = [(region, s, segments if segments > 1 else None,
+                      shards, spill_dir) for s in range(segments)]
+        reduce_jobs = [(shard, segments, spill_dir) for shard in range(shards)]
+        pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        mapper = pool.map if pool else map
+        try:
+            # every segment must be spilled before any shard is reduced
+            list(mapper(_scan_segment, scan_jobs))
+            for count, part in mapper(_reduce_shard, reduce_jobs):
+                n_baskets += count
+                pairs.update(part)
+        finally:
+            if pool:
+                pool.shutdown()
+
+    return n_baskets, top_k_neighbors(pairs, top_k)
+
+
+def write(neighbors, region=REGION):
+    """Replace the recommendations with `neighbors`."""
+    table = boto3.resource(
+        'dynamodb', region_name=region).Table(RECOMMENDATIONS_TABLE)
+    stale = [item['id'] for item in scan_all(table, ProjectionExpression='id')
+             if item['id'] not in neighbors]
+    now = datetime.utcnow().isoformat()
+    with table.batch_writer(overwrite_by_pkeys=['id']) as batch:
+        for bid, top in neighbors.items():
+            batch.put_item(Item={
+                'id': bid,
+                'also_bought': [other for other, _ in top],
+                'counts': [count for _, count in top],
+                'updated_at': now
+            })
+        for bid in stale:
+            batch.delete_item(Key={'id': bid})
+    return len(stale)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Build co-purchase recommendations from orders.')
+    parser.add_argument('--region', default=REGION)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--segments', type=int, default=None,
+                        help='parallel scan segments (default: --workers)')
+    parser.add_argument('--shards', type=int, default=None,
+                        help='basket partitions reduced in parallel '
+                             '(default: 4x --workers)')
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--dry-run', action='store_true',
+                        help='compute but do not write results')
+    args = parser.parse_args()
+
+    started = datetime.utcnow()
+    n_baskets, neighbors = build(args.region, args.workers,
+                                 args.segments, args.top_k, args.shards)
+    removed = 0
+    if not args.dry_run:
+        removed = write(neighbors, args.region)
+    elapsed = (datetime.utcnow() - started).total_seconds()
+    print(f"Processed {n_baskets} orders, {len(neighbors)} books with "
+          f"co-purchases ({removed} stale removed) in {elapsed:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,8 @@
+def scan_all(table, **kwargs):
+    """Yield every item in a DynamoDB table, following LastEvaluatedKey."""
+    while True:
+        resp = table.scan(**kwargs)
+        yield from resp.get('Items', [])
+        if 'LastEvaluatedKey' not in resp:
+            return
+        kwargs['ExclusiveStartKey'] = resp['LastEvaluatedKey']
@@ -0,0 +1,63 @@
+"""Streaming CSV / NDJSON serializers for admin exports.
+
+Rows are pulled lazily from a paged DynamoDB scan and encoded one at a time,
+so memory stays flat however large the table is.
+"""
+import csv
+import io
+import json
+from decimal import Decimal
+
+# fixed CSV columns per table; nested values are written as JSON
+EXPORT_COLUMNS = {
+    'orders': ['id', 'original_order_id', 'created_at', 'status', 'buyer_email',
+               'buyer_name', 'seller_email', 'total', 'items', 'shipping_address'],
+    'users': ['email', 'name', 'role', 'created_at', 'addresses'],
+    'books': ['id', 'title', 'author', 'genre', 'price', 'stock', 'seller_email',
+              'seller_name', 'created_at', 'cover_url', 'summary'],
+}
+
+# never leave the database
+SENSITIVE_FIELDS = {'password'}
+
+
+def plain(value):
+    """Recursively convert DynamoDB Decimals and sets to JSON-friendly types."""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, dict):
+        return {k: plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        return [plain(v) for v in value]
+    return value
+
+
+def _clean(item):
+    return {k: plain(v) for k, v in item.items() if k not in SENSITIVE_FIELDS}
+
+
+def ndjson_rows(items):
+    for item in items:
+        yield json.dumps(_clean(item), separators=(',', ':')) + '\n'
+
+
+def csv_rows(items, columns):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+
+    def flush():
+        data = buf.getvalue()
+        buf.seek(0)
+        buf.truncate(0)
+        return data
+
+    writer.writerow(columns)
+    yield flush()
+    for item in items:
+        row = _clean(item)
+        writer.writerow([
+            json.dumps(row[c], separators=(',', ':'))
+            if isinstance(row.get(c), (dict, list)) else row.get(c, '')
+            for c in columns
+        ])
+        yield flush()
@@ -0,0 +1,163 @@
+"""Cross-process cache invalidation pub/sub.
+
+Each web worker keeps in-process caches (title matcher, prompt digest,
+similar-books index, ...). When one worker writes to the catalog it
+publishes a small message; every *other* worker's subscribers receive it and
+evict or refresh what it names.
+
+Backends:
+
+* MemoryBus     - instances on the same channel in one process see each
+                  other's messages; single-worker runs and tests
+* UnixSocketBus - one datagram socket per worker in a shared directory;
+                  every worker process on the host, sub-millisecond delivery
+
+A real broker (Redis pub/sub, SNS+SQS, ...) plugs in by subclassing
+InvalidationBus: implement start(), publish() and close(), and call
+self._dispatch(topic, message) for every message received from another
+process.
+"""
+import atexit
+import json
+import os
+import socket
+import tempfile
+import threading
+import uuid
+
+
+class InvalidationBus:
+    def __init__(self):
+        self._subscribers = []
+
+    def subscribe(self, callback):
+        """Call `callback(topic, message)` for messages from other processes."""
+        self._subscribers.append(callback)
+
+    def start(self):
+        pass
+
+    def publish(self, topic, message):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def _dispatch(self, topic, message):
+        for callback in list(self._subscribers):
+            try:
+                callback(topic, message)
+            except Exception as e:
+                print(f"Invalidation subscriber error on {topic}: {e}")
+
+
+class MemoryBus(InvalidationBus):
+    _channels = {}
+    _lock = threading.Lock()
+
+    def __init__(self, channel='default'):
+        super().__init__()
+        self.channel = channel
+
+    def start(self):
+        with self._lock:
+            self._channels.setdefault(self.channel, []).append(self)
+
+    def publish(self, topic, message):
+        with self._lock:
+            peers = [b for b in self._channels.get(self.channel, []) if b is not self]
+        for bus in peers:
+            bus._dispatch(topic, message)
+
+    def close(self):
+        with self._lock:
+            peers = self._channels.get(self.channel, [])
+            if self in peers:
+                peers.remove(self)
+
+
+class UnixSocketBus(InvalidationBus):
+    """Datagram fan-out over Unix sockets in `directory`.
+
+    Publishing sends one non-blocking datagram to every other socket in the
+    directory; sockets left behind by dead workers are removed on the first
+    failed send.
+    """
+
+    SUFFIX = '.sock'
+    MAX_MESSAGE = 64 * 1024
+
+    def __init__(self, directory=None):
+        super().__init__()
+        self.directory = directory or os.path.join(
+            tempfile.gettempdir(), 'bookbazaar-bus')
+        self.path = None
+        self._recv = None
+        self._send = None
+
+    def start(self):
+        if self._recv is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(
+            self.directory, f"{os.getpid()}-{uuid.uuid4().hex[:8]}{self.SUFFIX}")
+        self._recv = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._recv.bind(self.path)
+        self._send = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._send.setblocking(False)
+        threading.Thread(target=self._listen, daemon=True,
+                         name='invalidation-bus').start()
+        atexit.register(self.close)
+
+    def publish(self, topic, message):
+        if self._send is None:
+            self.start()
+        data = json.dumps({'topic': topic, 'message': message}).encode()
+        if len(data) > self.MAX_MESSAGE:
+            raise ValueError(f"Invalidation message too large ({len(data)} bytes)")
+        for name in os.listdir(self.directory):
+            peer = os.path.join(self.directory, name)
+            if not name.endswith(self.SUFFIX) or peer == self.path:
+                continue
+            try:
+                self._send.sendto(data, peer)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # the worker that owned it is gone
+                try:
+                    os.unlink(peer)
+                except OSError:
+                    pass
+            except BlockingIOError:
+                print(f"Invalidation bus: {name} is not keeping up; dropped {topic}")
+
+    def _listen(self):
+        while True:
+            try:
+                data = self._recv.recv(self.MAX_MESSAGE)
+            except OSError:
+                return  # closed
+            try:
+                envelope = json.loads(data)
+            except ValueError:
+                continue
+            self._dispatch(envelope.get('topic'), envelope.get('message'))
+
+    def close(self):
+        for sock in (self._recv, self._send):
+            if sock is not None:
+                sock.close()
+        self._recv = self._send = None
+        if self.path:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+            self.path = None
+
+
+def create_bus(kind='memory', directory=None):
+    if kind == 'socket':
+        return UnixSocketBus(directory)
+    if kind == 'memory':
+        return MemoryBus()
+    raise ValueError(f"Unknown invalidation bus {kind!r}")
@@ -0,0 +1,228 @@
+"""Fake Hugging Face chat-completions server for chatbot load testing.
+
+Speaks the OpenAI-style `/v1/chat/completions` shape that InferenceClient
+uses, so aws_app can be pointed at it with:
+
+    HF_BASE_URL=http://127.0.0.1:8080 python test_aws_app.py
+
+Latency, streaming and error injection are configurable, e.g.:
+
+    python mock_inference_server.py --latency lognormal --latency-ms 800 \\
+        --jitter-ms 300 --error-rate 0.02
+"""
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# first column of each catalog digest row in the system prompt
+_BOOK_ID_RE = re.compile(r'^([^|\s]+)\|(?:[^|\n]*\|){5}', re.MULTILINE)
+
+
+class LatencyModel:
+    """Sample per-request latency (seconds) from a named distribution."""
+
+    def __init__(self, kind='fixed', mean_ms=500, jitter_ms=0):
+        self.kind = kind
+        self.mean = mean_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+
+    def sample(self):
+        if self.kind == 'uniform':
+            value = random.uniform(self.mean - self.jitter,
+                                   self.mean + self.jitter)
+        elif self.kind == 'normal':
+            value = random.gauss(self.mean, self.jitter)
+        elif self.kind == 'lognormal':
+            # parameterised so the median is `mean` and `jitter` sets the tail
+            sigma = math.log1p(self.jitter / self.mean) if self.mean else 0
+            value = random.lognormvariate(math.log(self.mean or 1e-6), sigma)
+        else:
+            value = self.mean
+        return max(0.0, value)
+
+
+class MockConfig:
+    def __init__(self, latency, error_rate=0.0, error_status=503,
+                 tokens_per_second=50.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.tokens_per_second = tokens_per_second
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'errors': 0, 'streams': 0}
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+
+def build_reply(body):
+    """Build a chatbot-style JSON reply recommending books from the prompt."""
+    system = ''
+    for m in body.get('messages', []):
+        if m.get('role') == 'system':
+            system = m.get('content') or ''
+    ids = [i for i in _BOOK_ID_RE.findall(system) if i != 'id']
+    picks = random.sample(ids, min(2, len(ids))) if ids else []
+    return json.dumps({
+        'message': 'Here are a couple of books you might enjoy (mock response).',
+        'recommended_books': picks,
+        'action': 'none'
+    })
+
+
+def _completion(model, content):
+    return {
+        'id': f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': model,
+        'choices': [{
+            'index': 0,
+            'message': {'role': 'assistant', 'content': content},
+            'finish_reason': 'stop'
+        }],
+        'usage': {'prompt_tokens': 0, 'completion_tokens': len(content.split()),
+                  'total_tokens': len(content.split())}
+    }
+
+
+def _chunk(cid, model, delta, finish=None):
+    return {
+        'id': cid,
+        'object': 'chat.completion.chunk',
+        'created': int(time.time()),
+        'model': model,
+        'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish}]
+    }
+
+
+def make_handler(config):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def _send_json(self, status, payload):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.rstrip('/') == '/stats':
+                with config.lock:
+                    self._send_json(200, dict(config.stats))
+            else:
+                self._send_json(404, {'error': 'Not found'})
+
+        def do_POST(self):
+            if not self.path.rstrip('/').endswith('/chat/completions'):
+                self._send_json(404, {'error': 'Not found'})
+                return
+
+            length = int(self.headers.get('Content-Length') or 0)
+            try:
+                body = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                self._send_json(400, {'error': 'Invalid JSON'})
+                return
+
+            config.count('requests')
+            time.sleep(config.latency.sample())
+
+            if config.error_rate and random.random() < config.error_rate:
+                config.count('errors')
+                self._send_json(config.error_status, {
+                                'error': 'Injected failure'})
+                return
+
+            model = body.get('model') or 'mock-model'
+            content = build_reply(body)
+            if body.get('stream'):
+                config.count('streams')
+                self._stream(model, content)
+            else:
+                self._send_json(200, _completion(model, content))
+
+        def _stream(self, model, content):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+
+            cid = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+            delay = 1.0 / config.tokens_per_second if config.tokens_per_second else 0
+            pieces = re.findall(r'\S+\s*', content)
+            events = [_chunk(cid, model, {'role': 'assistant', 'content': ''})]
+            events += [_chunk(cid, model, {'content': p}) for p in pieces]
+            events.append(_chunk(cid, model, {}, finish='stop'))
+            try:
+                for event in events:
+                    self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+                    self.wfile.flush()
+                    if delay:
+                        time.sleep(delay)
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            self.close_connection = True
+
+    return Handler
+
+
+def serve(host='127.0.0.1', port=8080, config=None):
+    """Start the mock server in a background thread and return it."""
+    config = config or MockConfig(LatencyModel())
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    server.config = config
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', default='fixed',
+                        choices=['fixed', 'uniform', 'normal', 'lognormal'])
+    parser.add_argument('--latency-ms', type=float, default=500)
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='fraction of requests that fail (0-1)')
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--tokens-per-second', type=float, default=50.0,
+                        help='pacing for streamed responses')
+    args = parser.parse_args()
+
+    config = MockConfig(
+        LatencyModel(args.latency, args.latency_ms, args.jitter_ms),
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        tokens_per_second=args.tokens_per_second)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(config))
+    server.daemon_threads = True
+    print(f">>> Mock inference server at http://{args.host}:{args.port} "
+          f"({args.latency} {args.latency_ms}ms, error rate {args.error_rate})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
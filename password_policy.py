@@ -0,0 +1,78 @@
+"""Configurable password hashing run in a dedicated process pool.
+
+The policy is a werkzeug method string, e.g. 'scrypt:32768:8:1' or
+'pbkdf2:sha256:600000', read from PASSWORD_HASH_METHOD. Hashing and
+verification are CPU-bound and hold the GIL, so they run in worker
+processes and web threads only wait on a future.
+
+Hashes store the method they were made with ('<method>$<salt>$<hash>'), so
+a login can tell when a stored hash predates the current policy and
+re-hash the password it just verified.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULT_METHOD = 'scrypt'
+# forkserver where the platform has it (not Windows), else spawn
+_START_METHOD = ('forkserver' if 'forkserver' in
+                 multiprocessing.get_all_start_methods() else 'spawn')
+
+
+def _method_of(pwhash):
+    return (pwhash or '').split('$', 1)[0]
+
+
+class PasswordPolicy:
+    def __init__(self, method=DEFAULT_METHOD, workers=None):
+        # werkzeug fills in default cost parameters ('scrypt' ->
+        # 'scrypt:32768:8:1'); hash once so rehash checks compare like for like
+        self.method = _method_of(generate_password_hash('', method=method))
+        self.workers = workers or os.cpu_count() or 1
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        workers = os.environ.get('PASSWORD_HASH_WORKERS')
+        return cls(os.environ.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD),
+                   int(workers) if workers else None)
+
+    def _executor(self):
+        # Created on first use so importing the app starts no processes.
+        # Every gunicorn worker starts its own pool, so size
+        # PASSWORD_HASH_WORKERS per web worker, not per host. The pool is
+        # created from inside a threaded server (request threads, boto3's
+        # connection pool, the invalidation-bus listener), so children come
+        # from a forkserver (or spawn); a plain fork could copy a lock held
+        # by another thread and deadlock.
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(_START_METHOD))
+            return self._pool
+
+    def hash(self, password):
+        return self._executor().submit(
+            generate_password_hash, password, self.method).result()
+
+    def verify(self, pwhash, password):
+        """Return (matches, needs_rehash) for a stored hash."""
+        if not pwhash or password is None:
+            return False, False
+        ok = self._executor().submit(
+            check_password_hash, pwhash, password).result()
+        return ok, ok and self.needs_rehash(pwhash)
+
+    def needs_rehash(self, pwhash):
+        return _method_of(pwhash) != self.method
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
@@ -0,0 +1,151 @@
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Retry-After sent when the bucket can never refill (rate 0)
+MAX_RETRY_AFTER = 3600
+
+
+def _refill(tokens, updated, now, rate, capacity):
+    return min(capacity, tokens + (now - updated) * rate)
+
+
+def _take(tokens, rate, cost):
+    """Return (allowed, tokens_left, retry_after) for a refilled bucket."""
+    if tokens >= cost:
+        return True, tokens - cost, 0.0
+    if rate <= 0:
+        return False, tokens, float(MAX_RETRY_AFTER)
+    return False, tokens, min((cost - tokens) / rate, MAX_RETRY_AFTER)
+
+
+class MemoryBucketStore:
+    """Token buckets held in this process. Limits are per worker.
+
+    At most `max_keys` buckets are kept; the least recently used go first.
+    Those have usually refilled to capacity, which is the same as no bucket.
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+
+    def take(self, key, rate, capacity, cost=1, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = _refill(tokens, updated, now, rate, capacity)
+            allowed, tokens, retry_after = _take(tokens, rate, cost)
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return allowed, retry_after
+
+
+class SQLiteBucketStore:
+    """Token buckets in a local SQLite file shared by every worker process.
+
+    Stand-in for a shared store such as Redis or DynamoDB: each take() runs
+    inside an IMMEDIATE transaction so concurrent processes serialize on it.
+    Every `sweep_interval` seconds rows that have refilled to capacity are
+    deleted, since a full bucket is the same as no row.
+    """
+
+    def __init__(self, path, sweep_interval=60):
+        self.path = path
+        self.sweep_interval = sweep_interval
+        self._next_sweep = 0
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS buckets '
+            '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)')
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def take(self, key, rate, capacity, cost=1, now=None):
+        now = time.time() if now is None else now
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+            tokens, updated = row if row else (capacity, now)
+            tokens = _refill(tokens, updated, now, rate, capacity)
+            allowed, tokens, retry_after = _take(tokens, rate, cost)
+            conn.execute(
+                'INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)',
+                (key, tokens, now))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        if now >= self._next_sweep:
+            self._next_sweep = now + self.sweep_interval
+            self.sweep(rate, capacity, now)
+        return allowed, retry_after
+
+    def sweep(self, rate, capacity, now=None):
+        """Delete buckets whose refill has reached `capacity`."""
+        now = time.time() if now is None else now
+        self._conn().execute(
+            'DELETE FROM buckets WHERE tokens + (? - updated) * ? >= ?',
+            (now, rate, capacity))
+
+
+class RateLimiter:
+    """Token-bucket limiter: `rate` tokens/second refill, bursts up to `capacity`.
+
+    A rate of 0 denies every request. A negative rate, or a capacity that
+    cannot cover one request of `cost`, is rejected here rather than at the
+    first hit.
+    """
+
+    def __init__(self, store, rate, capacity, name='ratelimit', cost=1):
+        rate, capacity = float(rate), float(capacity)
+        if not rate >= 0:
+            raise ValueError(f"{name}: rate must be >= 0, got {rate}")
+        if not capacity >= cost:
+            raise ValueError(
+                f"{name}: capacity {capacity} is below the cost of one request ({cost})")
+        self.store = store
+        self.rate = rate
+        self.capacity = capacity
+        self.cost = cost
+        self.name = name
+        self._lock = threading.Lock()
+        self.metrics = {'allowed': 0, 'rejected': 0}
+
+    def hit(self, key, cost=None):
+        """Consume `cost` tokens for `key`.
+
+        Returns (allowed, retry_after_seconds). If the store fails the request
+        is allowed so a broken limiter never takes the endpoint down.
+        """
+        cost = self.cost if cost is None else cost
+        if self.rate == 0 or cost > self.capacity:
+            allowed, retry_after = False, MAX_RETRY_AFTER
+        else:
+            try:
+                allowed, retry_after = self.store.take(
+                    key, self.rate, self.capacity, cost)
+            except Exception as e:
+                print(f"[{self.name}] store error, allowing request: {e}")
+                return True, 0
+
+        with self._lock:
+            self.metrics['allowed' if allowed else 'rejected'] += 1
+        if not allowed:
+            print(f"[METRIC] {self.name}.rejected key={key} "
+                  f"retry_after={retry_after:.2f}s total={self.metrics['rejected']}")
+        return allowed, int(math.ceil(retry_after))
@@ -0,0 +1,312 @@
+"""Incremental revenue rollups for admin analytics.
+
+Every order write adjusts small counter items in BookBazaar_Rollups instead
+of analytics rescanning the Orders table. Items are keyed by
+
+    series = '<granularity>#<seller email or ALL>'   (partition key)
+    bucket = '2026-10-19T14' | '2026-10-19' | 'all'   (sort key)
+
+and hold `revenue`, `orders` and one `status:<name>` counter per status,
+all maintained with atomic ADD updates. A time range is a single Query on
+the sort key.
+
+Orders placed before the rollups existed are not counted until they are
+backfilled with:
+
+    python rollups.py --rebuild
+
+A rebuild never overwrites the rollups that live checkouts are updating.
+It fills a new generation (series prefixed 'g<n>#'), which the meta item
+series='meta', bucket='generation' names once it is complete:
+
+1. The meta item gets `building` = n and a `cutoff` a little in the
+   future. Writers re-read it every GENERATION_TTL seconds. From then on
+   they also apply orders created at or after the cutoff to generation n.
+2. After the cutoff, Orders is scanned and every order created before it
+   is ADDed into generation n.
+3. `live` moves to n, and every item of an older generation is deleted,
+   including buckets that no longer have any orders.
+
+An order created before the cutoff whose status changes, or which loses an
+item, while the scan is running may be counted as it was before or after
+that change. Run the rebuild when admins are not editing orders.
+"""
+import argparse
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import boto3
+from boto3.dynamodb.conditions import Key
+
+from dynamo_utils import scan_all
+
+ROLLUPS_TABLE = 'BookBazaar_Rollups'
+ALL = 'ALL'
+TOTAL_BUCKET = 'all'
+BUCKET_FORMATS = {'hour': '%Y-%m-%dT%H', 'day': '%Y-%m-%d'}
+META_KEY = {'series': 'meta', 'bucket': 'generation'}
+# How long a process trusts its copy of the meta item
+GENERATION_TTL = 30
+
+
+def series_key(granularity, seller_email=None, generation=0):
+    key = f"{granularity}#{seller_email or ALL}"
+    return f"g{generation}#{key}" if generation else key
+
+
+def generation_of(series):
+    """Generation a series key belongs to; unprefixed keys are generation 0."""
+    head, _, rest = series.partition('#')
+    if rest and head[:1] == 'g' and head[1:].isdigit():
+        return int(head[1:])
+    return 0
+
+
+def bucket_for(created_at, granularity):
+    """Bucket key for an ISO timestamp, or None if it cannot be parsed."""
+    if granularity == 'total':
+        return TOTAL_BUCKET
+    try:
+        ts = datetime.fromisoformat(str(created_at))
+    except (TypeError, ValueError):
+        return None
+    return ts.strftime(BUCKET_FORMATS[granularity])
+
+
+def _to_decimal(value):
+    try:
+        return Decimal(str(float(value or 0)))
+    except (TypeError, ValueError):
+        return Decimal('0')
+
+
+def _keys_for(created_at, seller_email, generation=0):
+    for granularity in ('hour', 'day', 'total'):
+        bucket = bucket_for(created_at, granularity)
+        if bucket is None:
+            continue
+        for scope in {ALL, seller_email or ALL}:
+            yield {'series': series_key(granularity, scope, generation),
+                   'bucket': bucket}
+
+
+def _after_cutoff(created_at, cutoff):
+    """Orders at or after a rebuild's cutoff are left to live writes."""
+    return str(created_at or '') >= cutoff
+
+
+def _read_meta(table):
+    item = table.get_item(Key=META_KEY, ConsistentRead=True).get('Item', {})
+    building = item.get('building')
+    return {'live': int(item.get('live', 0)),
+            'building': int(building) if building is not None else None,
+            'cutoff': item.get('cutoff')}
+
+
+class RevenueRollups:
+    def __init__(self, table, generation_ttl=GENERATION_TTL):
+        self.table = table
+        self.generation_ttl = generation_ttl
+        self._lock = threading.Lock()
+        self._meta = None
+        self._meta_expires = 0
+
+    def generations(self):
+        """The meta item, re-read at most every `generation_ttl` seconds."""
+        with self._lock:
+            if self._meta is None or time.monotonic() >= self._meta_expires:
+                try:
+                    self._meta = _read_meta(self.table)
+                except Exception as e:
+                    print(f"Error reading rollup generation: {e}")
+                    if self._meta is None:
+                        return {'live': 0, 'building': None, 'cutoff': None}
+                self._meta_expires = time.monotonic() + self.generation_ttl
+            return self._meta
+
+    def _targets(self, created_at):
+        meta = self.generations()
+        targets = [meta['live']]
+        if meta['building'] is not None and _after_cutoff(created_at, meta['cutoff']):
+            targets.append(meta['building'])
+        return targets
+
+    def record(self, created_at, seller_email, revenue=0, orders=0, statuses=None):
+        """Add deltas to every rollup bucket an order falls into."""
+        names = {}
+        values = {}
+        parts = []
+        if revenue:
+            names['#rev'] = 'revenue'
+            values[':rev'] = _to_decimal(revenue)
+            parts.append('#rev :rev')
+        if orders:
+            names['#ord'] = 'orders'
+            values[':ord'] = int(orders)
+            parts.append('#ord :ord')
+        for i, (status, delta) in enumerate((statuses or {}).items()):
+            if status and delta:
+                names[f'#s{i}'] = f"status:{status}"
+                values[f':s{i}'] = int(delta)
+                parts.append(f'#s{i} :s{i}')
+        if not parts:
+            return
+
+        for generation in self._targets(created_at):
+            for key in _keys_for(created_at, seller_email, generation):
+                try:
+                    self.table.update_item(
+                        Key=key,
+                        UpdateExpression='ADD ' + ', '.join(parts),
+                        ExpressionAttributeNames=names,
+                        ExpressionAttributeValues=values
+                    )
+                except Exception as e:
+                    print(f"Error updating rollup {key}: {e}")
+
+    def order_placed(self, order):
+        self.record(order.get('created_at'), order.get('seller_email'),
+                    revenue=order.get('total', 0), orders=1,
+                    statuses={order.get('status', 'Placed'): 1})
+
+    def status_changed(self, order, old_status, new_status):
+        if old_status == new_status:
+            return
+        self.record(order.get('created_at'), order.get('seller_email'),
+                    statuses={old_status: -1, new_status: 1})
+
+    def item_removed(self, order, subtotal):
+        self.record(order.get('created_at'), order.get('seller_email'),
+                    revenue=-_to_decimal(subtotal))
+
+    def series(self, granularity, start, end, seller_email=None):
+        """Return rollup points for buckets in [start, end] (bucket strings)."""
+        live = self.generations()['live']
+        kwargs = {'KeyConditionExpression': Key('series').eq(
+            series_key(granularity, seller_email, live)) & Key('bucket').between(start, end)}
+        points = []
+        while True:
+            resp = self.table.query(**kwargs)
+            points.extend(_point(item) for item in resp.get('Items', []))
+            if 'LastEvaluatedKey' not in resp:
+                return points
+            kwargs['ExclusiveStartKey'] = resp['LastEvaluatedKey']
+
+    def totals(self, seller_email=None):
+        live = self.generations()['live']
+        item = self.table.get_item(Key={
+            'series': series_key('total', seller_email, live),
+            'bucket': TOTAL_BUCKET}).get('Item', {})
+        return _point(item)
+
+
+def _point(item):
+    revenue = float(item.get('revenue', 0) or 0)
+    orders = int(item.get('orders', 0) or 0)
+    return {
+        'bucket': item.get('bucket', TOTAL_BUCKET),
+        'revenue': round(revenue, 2),
+        'orders': orders,
+        'average_order_value': round(revenue / orders, 2) if orders else 0.0,
+        'statuses': {k[len('status:'):]: int(v) for k, v in item.items()
+                     if k.startswith('status:') and int(v)}
+    }
+
+
+def _add_entry(table, series, bucket, entry):
+    names = {'#rev': 'revenue', '#ord': 'orders'}
+    values = {':rev': entry['revenue'], ':ord': entry['orders']}
+    parts = ['#rev :rev', '#ord :ord']
+    for i, (status, n) in enumerate(entry['statuses'].items()):
+        names[f'#s{i}'] = f"status:{status}"
+        values[f':s{i}'] = n
+        parts.append(f'#s{i} :s{i}')
+    table.update_item(
+        Key={'series': series, 'bucket': bucket},
+        UpdateExpression='ADD ' + ', '.join(parts),
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues=values
+    )
+
+
+def _delete_other_generations(rollups_table, keep):
+    deleted = 0
+    with rollups_table.batch_writer() as batch:
+        for item in scan_all(rollups_table, ProjectionExpression='#s, #b',
+                             ExpressionAttributeNames={'#s': 'series', '#b': 'bucket'}):
+            if item['series'] == META_KEY['series'] or generation_of(item['series']) == keep:
+                continue
+            batch.delete_item(Key={'series': item['series'], 'bucket': item['bucket']})
+            deleted += 1
+    return deleted
+
+
+def rebuild(orders_table, rollups_table, settle=GENERATION_TTL + 5, sleep=time.sleep):
+    """Recompute every rollup item from Orders into a new generation.
+
+    Live writes keep going to the current generation throughout; see the
+    module docstring for the steps. Returns (orders, items, deleted).
+    """
+    meta = _read_meta(rollups_table)
+    generation = max(meta['live'], meta['building'] or 0) + 1
+    cutoff = (datetime.utcnow() + timedelta(seconds=settle)).isoformat()
+    rollups_table.update_item(
+        Key=META_KEY,
+        UpdateExpression='SET #b = :b, #c = :c',
+        ExpressionAttributeNames={'#b': 'building', '#c': 'cutoff'},
+        ExpressionAttributeValues={':b': generation, ':c': cutoff}
+    )
+    # every writer has re-read the meta item before the cutoff
+    sleep(settle)
+
+    acc = defaultdict(lambda: {'revenue': Decimal('0'), 'orders': 0,
+                               'statuses': defaultdict(int)})
+    count = 0
+    for order in scan_all(orders_table):
+        if _after_cutoff(order.get('created_at'), cutoff):
+            continue
+        count += 1
+        for key in _keys_for(order.get('created_at'), order.get('seller_email'), generation):
+            entry = acc[(key['series'], key['bucket'])]
+            entry['revenue'] += _to_decimal(order.get('total', 0))
+            entry['orders'] += 1
+            entry['statuses'][order.get('status', 'Unknown')] += 1
+
+    # ADD rather than put: writers may already have filled these buckets
+    for (series, bucket), entry in acc.items():
+        _add_entry(rollups_table, series, bucket, entry)
+
+    rollups_table.update_item(
+        Key=META_KEY,
+        UpdateExpression='SET #l = :l REMOVE #b, #c',
+        ExpressionAttributeNames={'#l': 'live', '#b': 'building', '#c': 'cutoff'},
+        ExpressionAttributeValues={':l': generation}
+    )
+    # let writers still holding the old meta item finish with it
+    sleep(settle)
+    return count, len(acc), _delete_other_generations(rollups_table, generation)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain revenue rollups.')
+    parser.add_argument('--rebuild', action='store_true',
+                        help='recompute all rollups from BookBazaar_Orders')
+    parser.add_argument('--region', default='us-east-1')
+    args = parser.parse_args()
+
+    if not args.rebuild:
+        parser.print_help()
+        return
+
+    dynamodb = boto3.resource('dynamodb', region_name=args.region)
+    orders, items, deleted = rebuild(dynamodb.Table('BookBazaar_Orders'),
+                                     dynamodb.Table(ROLLUPS_TABLE))
+    print(f"Rebuilt {items} rollup items from {orders} orders; "
+          f"deleted {deleted} items of older generations")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+"""Server-side Flask sessions keyed by an opaque session-id cookie.
+
+Session data (user, cart, wishlist) lives in a store instead of the signed
+cookie, so the cookie stays a fixed ~45 bytes however much is in the cart.
+The store is only read when a request touches `session`, and only written
+back when the request modified it. Session ids are only ever generated
+here: a cookie naming a sid the store does not know starts a fresh session
+under a new id, and regenerate() moves the data to a new id on login.
+
+Stores implement load(sid), save(sid, data, ttl) and delete(sid), where
+data is the string produced by Flask's own tagged-JSON session serializer:
+
+* MemorySessionStore  - per-process LRU, for a single worker or local runs
+* DynamoDBSessionStore - shared across workers/instances; table keyed by
+                         `sid` with TTL enabled on `expires_at`
+
+Store errors are not swallowed. A failed load must not look like an unknown
+sid, which would log the user out, and a failed save must not drop the
+session quietly, so either one fails the request.
+"""
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+
+_serializer = TaggedJSONSerializer()
+
+
+def _new_sid():
+    return secrets.token_urlsafe(32)
+
+
+class MemorySessionStore:
+    def __init__(self, max_sessions=10000):
+        self.max_sessions = max_sessions
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, sid):
+        with self._lock:
+            entry = self._data.get(sid)
+            if entry is None:
+                return None
+            expires_at, data = entry
+            if expires_at <= time.time():
+                del self._data[sid]
+                return None
+            self._data.move_to_end(sid)
+            return data
+
+    def save(self, sid, data, ttl):
+        with self._lock:
+            self._data[sid] = (time.time() + ttl, data)
+            self._data.move_to_end(sid)
+            while len(self._data) > self.max_sessions:
+                self._data.popitem(last=False)
+
+    def delete(self, sid):
+        with self._lock:
+            self._data.pop(sid, None)
+
+
+class DynamoDBSessionStore:
+    def __init__(self, table):
+        self.table = table
+
+    def load(self, sid):
+        # consistent, or the redirect straight after login/regenerate() can
+        # miss the item just written and start an empty session
+        item = self.table.get_item(
+            Key={'sid': sid}, ConsistentRead=True).get('Item')
+        # TTL deletion lags, so expiry is checked on read as well
+        if not item or int(item.get('expires_at', 0)) <= time.time():
+            return None
+        return item.get('data')
+
+    def save(self, sid, data, ttl):
+        self.table.put_item(Item={
+            'sid': sid,
+            'data': data,
+            'expires_at': int(time.time() + ttl)
+        })
+
+    def delete(self, sid):
+        self.table.delete_item(Key={'sid': sid})
+
+
+class ServerSession(dict, SessionMixin):
+    """dict that loads from the store on first use and tracks changes."""
+
+    def __init__(self, sid, store, new=False):
+        super().__init__()
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.accessed = False
+        self._store = store
+        self._loaded = new
+
+    def _load(self):
+        self.accessed = True
+        if not self._loaded:
+            self._loaded = True
+            data = self._store.load(self.sid)
+            if data:
+                dict.update(self, _serializer.loads(data))
+            else:
+                # unknown or expired: never adopt an id the client chose
+                self.sid = _new_sid()
+                self.new = True
+
+    def regenerate(self):
+        """Move the data to a new session id and drop the old entry.
+
+        Call on every privilege change (login) so an id planted before it
+        cannot be used after it.
+        """
+        self._load()
+        if not self.new:
+            self._store.delete(self.sid)
+        self.sid = _new_sid()
+        self.new = True
+        self.modified = True
+
+    def clear(self):
+        # nothing to read when everything is being dropped
+        self._loaded = True
+        self.accessed = True
+        self.modified = True
+        dict.clear(self)
+
+
+def _reader(name):
+    method = getattr(dict, name)
+
+    def wrapper(self, *args, **kwargs):
+        self._load()
+        return method(self, *args, **kwargs)
+    wrapper.__name__ = name
+    return wrapper
+
+
+def _writer(name):
+    method = getattr(dict, name)
+
+    def wrapper(self, *args, **kwargs):
+        self._load()
+        self.modified = True
+        return method(self, *args, **kwargs)
+    wrapper.__name__ = name
+    return wrapper
+
+
+for _name in ('__getitem__', '__contains__', '__iter__', '__len__', '__repr__',
+              'get', 'keys', 'values', 'items', 'copy'):
+    setattr(ServerSession, _name, _reader(_name))
+for _name in ('__setitem__', '__delitem__', 'setdefault', 'pop', 'popitem',
+              'update'):
+    setattr(ServerSession, _name, _writer(_name))
+
+
+class ServerSessionInterface(SessionInterface):
+    def __init__(self, store):
+        self.store = store
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if not sid:
+            return ServerSession(_new_sid(), self.store, new=True)
+        return ServerSession(sid, self.store)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+        if not session.modified:
+            return
+
+        if not session:
+            if not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        ttl = int(app.permanent_session_lifetime.total_seconds())
+        try:
+            self.store.save(session.sid, _serializer.dumps(dict(session)), ttl)
+        except Exception:
+            app.logger.exception('Failed to save session')
+            raise
+        if session.new or session.permanent:
+            response.set_cookie(
+                name, session.sid,
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain, path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app))
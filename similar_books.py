@@ -0,0 +1,170 @@
+"""Hashed TF-IDF "similar books" index built with NumPy.
+
+Each book becomes a row vector over `dim` hashed token features taken from
+its title, author, genre and summary. Rows are TF-IDF weighted, L2
+normalized and stored sparse, so cosine similarity against the whole
+catalog is one pass over the non-zero values.
+
+Build the index offline from the Books table with:
+
+    python similar_books.py --out similar_books.npz
+
+and point SIMILAR_INDEX_PATH at the file. aws_app uses it until a title,
+author, genre or summary changes after the feed version it was built at,
+then rebuilds in-process; stock changes never invalidate it.
+"""
+import argparse
+import math
+import zlib
+
+import boto3
+import numpy as np
+
+from catalog_feed import CATALOG_CHANGES_TABLE, CatalogFeed
+from dynamo_utils import scan_all
+from title_matcher import normalize_tokens
+
+DEFAULT_DIM = 1024
+
+# repeat counts: how strongly each field shapes similarity
+FIELD_WEIGHTS = (('title', 2), ('author', 2), ('genre', 3), ('summary', 1))
+
+
+def _features(tokens, dim):
+    """Map tokens to {column: signed sublinear term frequency}."""
+    counts = {}
+    for tok in tokens:
+        h = zlib.crc32(tok.encode())
+        col = h % dim
+        sign = -1.0 if h & 0x80000000 else 1.0
+        counts[col] = counts.get(col, 0.0) + sign
+    return {c: math.copysign(1.0 + math.log(abs(v)), v)
+            for c, v in counts.items() if v}
+
+
+def _book_tokens(book):
+    tokens = []
+    for field, weight in FIELD_WEIGHTS:
+        tokens.extend(normalize_tokens(str(book.get(field) or '')) * weight)
+    return tokens
+
+
+class SimilarBooksIndex:
+    """Sparse (CSR) TF-IDF rows: ~50 non-zero features per book instead of
+    `dim` dense floats, so 100k books take tens of MB rather than 400."""
+
+    def __init__(self, ids, indptr, indices, data, idf, catalog_version=0):
+        self.ids = list(ids)
+        self.rows = {bid: i for i, bid in enumerate(self.ids)}
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.idf = idf
+        self.dim = len(idf)
+        self.catalog_version = catalog_version
+        # row number of every stored value, for per-row sums with bincount
+        self._row_of = np.repeat(np.arange(len(self.ids), dtype=np.int32),
+                                 np.diff(indptr))
+
+    @classmethod
+    def build(cls, books, dim=DEFAULT_DIM, catalog_version=0):
+        books = [b for b in books if b.get('id') is not None]
+        ids = [str(b['id']) for b in books]
+        indptr = np.zeros(len(books) + 1, dtype=np.int64)
+        cols, vals = [], []
+        for i, b in enumerate(books):
+            feats = _features(_book_tokens(b), dim)
+            cols.extend(feats.keys())
+            vals.extend(feats.values())
+            indptr[i + 1] = len(cols)
+        indices = np.array(cols, dtype=np.int32)
+        data = np.array(vals, dtype=np.float32)
+
+        df = np.bincount(indices, minlength=dim)
+        idf = (np.log((1.0 + len(books)) / (1.0 + df)) +
+               1.0).astype(np.float32)
+        data *= idf[indices]
+        index = cls(ids, indptr, indices, data, idf, catalog_version)
+        index._normalize_rows()
+        return index
+
+    def similar(self, book_id, k=5):
+        """Return [(book_id, score)] for the k books most like `book_id`."""
+        row = self.rows.get(str(book_id))
+        if row is None:
+            return []
+        vec = np.zeros(self.dim, dtype=np.float32)
+        lo, hi = self.indptr[row], self.indptr[row + 1]
+        vec[self.indices[lo:hi]] = self.data[lo:hi]
+        return self._top_k(self._scores(vec), k, exclude=row)
+
+    def query(self, text, k=5, min_score=0.0):
+        """Return [(book_id, score)] for the k books closest to free text."""
+        feats = _features(normalize_tokens(text), self.dim)
+        if not feats or not self.ids:
+            return []
+        vec = np.zeros(self.dim, dtype=np.float32)
+        vec[list(feats.keys())] = list(feats.values())
+        vec *= self.idf
+        norm = np.linalg.norm(vec)
+        if not norm:
+            return []
+        results = self._top_k(self._scores(vec / norm), k)
+        return [(bid, score) for bid, score in results if score > min_score]
+
+    def _scores(self, vec):
+        """Dot product of every row with the dense vector `vec`."""
+        return np.bincount(self._row_of, weights=self.data * vec[self.indices],
+                           minlength=len(self.ids))
+
+    def _normalize_rows(self):
+        norms = np.sqrt(np.bincount(
+            self._row_of, weights=self.data.astype(np.float64) ** 2,
+            minlength=len(self.ids)))
+        norms[norms == 0] = 1.0
+        self.data /= norms[self._row_of].astype(np.float32)
+
+    def _top_k(self, scores, k, exclude=None):
+        if exclude is not None:
+            scores[exclude] = -np.inf
+        k = min(k, len(scores) - (1 if exclude is not None else 0))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[i], float(scores[i])) for i in top]
+
+    def save(self, path):
+        np.savez(path, ids=np.array(self.ids, dtype=str), indptr=self.indptr,
+                 indices=self.indices, data=self.data, idf=self.idf,
+                 catalog_version=np.array(self.catalog_version))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['ids'].tolist(), data['indptr'], data['indices'],
+                       data['data'], data['idf'], int(data['catalog_version']))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Build the similar-books index from DynamoDB.')
+    parser.add_argument('--out', default='similar_books.npz')
+    parser.add_argument('--dim', type=int, default=DEFAULT_DIM)
+    parser.add_argument('--region', default='us-east-1')
+    args = parser.parse_args()
+
+    dynamodb = boto3.resource('dynamodb', region_name=args.region)
+    # the feed version read before the scan: the app reuses the file while
+    # no content change has been logged after it
+    version = CatalogFeed(dynamodb.Table(CATALOG_CHANGES_TABLE)).latest()
+    books = list(scan_all(dynamodb.Table('BookBazaar_Books'), ConsistentRead=True))
+    index = SimilarBooksIndex.build(
+        books, dim=args.dim, catalog_version=version)
+    index.save(args.out)
+    print(f"Indexed {len(index.ids)} books ({args.dim} dims) at catalog "
+          f"version {version} -> {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,95 @@
+// Book details for chatbot cards, fetched in batches from /api/books and
+// tagged with the catalog version they are current for. When a response
+// reports a newer version, cached books are brought forward by replaying
+// /api/catalog/changes rather than refetched. Kept in sessionStorage so it
+// survives page changes.
+const bookCache = {
+  key: "bookbazaar.bookCache",
+  fields: "id,title,author,price,genre,summary,cover_url",
+  version: null,
+  books: new Map(),
+
+  load() {
+    try {
+      const saved = JSON.parse(sessionStorage.getItem(this.key) || "null");
+      if (saved) {
+        this.version = saved.version;
+        this.books = new Map(saved.books);
+      }
+    } catch (err) {
+      this.books = new Map();
+    }
+  },
+
+  save() {
+    try {
+      sessionStorage.setItem(
+        this.key,
+        JSON.stringify({ version: this.version, books: [...this.books] }),
+      );
+    } catch (err) {
+      // storage full or disabled: the in-memory cache still works
+    }
+  },
+
+  async sync(version) {
+    if (version === undefined || version === null) return;
+    if (this.version === null || !this.books.size) {
+      this.version = Math.max(this.version || 0, version);
+      this.save();
+      return;
+    }
+    if (version <= this.version) return;
+    try {
+      let data;
+      do {
+        const res = await fetch(`/api/catalog/changes?since=${this.version}`);
+        if (!res.ok) throw new Error("network");
+        data = await res.json();
+        if (data.reset) throw new Error("catalog history expired");
+        data.changes.forEach((change) => this.apply(change));
+        this.version = data.version;
+      } while (data.has_more);
+    } catch (err) {
+      // cannot replay: start over from the new version
+      this.books.clear();
+      this.version = version;
+    }
+    this.save();
+  },
+
+  // only books already cached are touched; new ones load on demand
+  apply(change) {
+    const book = this.books.get(String(change.book_id));
+    if (!book) return;
+    if (change.op === "delete") this.books.delete(String(change.book_id));
+    else Object.assign(book, change.book);
+  },
+
+  prime(books) {
+    books.forEach((book) => this.books.set(String(book.id), book));
+    this.save();
+  },
+
+  // resolve the given ids, fetching every uncached one in a single request
+  async get(ids) {
+    const missing = ids.map(String).filter((id) => !this.books.has(id));
+    if (missing.length) {
+      const params = new URLSearchParams({
+        ids: missing.join(","),
+        fields: this.fields,
+      });
+      const res = await fetch(`/api/books?${params}`);
+      if (!res.ok) throw new Error("network");
+      const data = await res.json();
+      await this.sync(data.catalog_version);
+      this.prime(data.books);
+    }
+    return ids.map((id) => this.books.get(String(id))).filter(Boolean);
+  },
+};
+bookCache.load();
+
 // Chatbot functionality
 class Chatbot {
   constructor() {
@@ -220,6 +312,9 @@ class Chatbot {
 
           // Display recommended books if provided
           if (data.books && data.books.length > 0) {
+            bookCache
+              .sync(data.catalog_version)
+              .then(() => bookCache.prime(data.books));
             this.displayBooks(data.books);
           }
         } else {
@@ -418,9 +513,10 @@ window.openBookModal = function (bookId) {
     bookCard.click();
   } else {
     // If modal system exists, fetch book details and open modal
-    fetch(`/api/book/${bookId}`)
-      .then((response) => response.json())
-      .then((book) => {
+    bookCache
+      .get([bookId])
+      .then(([book]) => {
+        if (!book) throw new Error("Book not found");
         if (typeof showBookDetails === "function") {
           showBookDetails(book);
         } else {
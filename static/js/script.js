@@ -37,29 +37,136 @@ window.addEventListener("load", () => {
 
 // Wishlist heart toggle (AJAX)
 document.addEventListener("DOMContentLoaded", () => {
-  document.querySelectorAll(".card-heart").forEach((btn) => {
-    btn.addEventListener("click", async (e) => {
-      e.preventDefault();
-      const id = btn.dataset.bookId;
+  // Cart and wishlist changes are queued and sent as one batch request once
+  // clicks pause for `delay` ms; repeated ops on the same book are merged by
+  // `merge(previous, op)` (returning null drops the op). Each enqueue()
+  // resolves with the batch response, or null if its op cancelled out.
+  function createBatcher(url, merge, delay = 300) {
+    let pending = new Map();
+    let waiters = [];
+    let timer = null;
+
+    async function flush() {
+      clearTimeout(timer);
+      timer = null;
+      const ops = [...pending.values()];
+      const batch = waiters;
+      pending = new Map();
+      waiters = [];
+      if (!ops.length) {
+        batch.forEach((w) => w.resolve(null));
+        return;
+      }
       try {
-        const res = await fetch(`/wishlist/toggle/${id}`, {
+        const res = await fetch(url, {
           method: "POST",
           credentials: "same-origin",
+          headers: {
+            "Content-Type": "application/json",
+            Accept: "application/json",
+          },
+          body: JSON.stringify({ ops }),
+          // lets a flush started by pagehide finish after navigation
+          keepalive: true,
         });
         if (!res.ok) throw new Error("network");
         const data = await res.json();
-        if (data.added) btn.classList.add("hearted");
-        else btn.classList.remove("hearted");
-        // update global cart/wishlist badges if present
-        // update any cart badge variant we have in the header
-        const badge = document.querySelector(
-          ".cart-btn .cart-badge, .nav-cart .cart-badge",
-        );
-        if (badge && data.count !== undefined) badge.textContent = data.count;
-        // show transient notification to user
-        const msg = data.added ? "Added to wishlist" : "Removed from wishlist";
-        showFlash(msg, data.added ? "success" : "error");
+        batch.forEach((w) => w.resolve(data));
+      } catch (err) {
+        batch.forEach((w) => w.reject(err));
+      }
+    }
+
+    window.addEventListener("pagehide", () => {
+      if (timer) flush();
+    });
+
+    return function enqueue(op) {
+      const key = String(op.book_id);
+      const merged = merge(pending.get(key), op);
+      if (merged) pending.set(key, merged);
+      else pending.delete(key);
+      clearTimeout(timer);
+      timer = setTimeout(flush, delay);
+      return new Promise((resolve, reject) => waiters.push({ resolve, reject }));
+    };
+  }
+
+  // two toggles of one book cancel out; a toggle after add/remove flips it
+  const queueWishlist = createBatcher("/api/wishlist/batch", (prev, op) => {
+    if (!prev || op.op !== "toggle") return op;
+    if (prev.op === "toggle") return null;
+    return { ...op, op: prev.op === "add" ? "remove" : "add" };
+  });
+
+  // quantity deltas add up; a delta after a remove becomes a set
+  const queueCart = createBatcher("/api/cart/batch", (prev, op) => {
+    if (!prev || op.op !== "add") return op;
+    if (prev.op === "remove") return { ...op, op: "set" };
+    return { ...prev, qty: prev.qty + op.qty };
+  });
+
+  function setCartBadge(count) {
+    const cartBadge = document.querySelector(
+      ".cart-btn .cart-badge, .nav-cart .cart-badge",
+    );
+    if (cartBadge && count !== undefined) cartBadge.textContent = count;
+  }
+
+  function setWishlistBadge(count) {
+    const sb = document.getElementById("sb-wishlist");
+    if (!sb || count === undefined) return;
+    let badge = sb.querySelector(".sb-badge");
+    if (count > 0) {
+      if (!badge) {
+        badge = document.createElement("span");
+        badge.className = "sb-badge";
+        sb.appendChild(badge);
+      }
+      badge.textContent = count;
+    } else if (badge) {
+      badge.remove();
+    }
+  }
+
+  // apply a /api/cart/batch response to the cart table and header badge
+  function renderCart(data) {
+    if (!data) return;
+    Object.entries(data.lines || {}).forEach(([bookId, line]) => {
+      const row = document.querySelector(`tr[data-book-id="${bookId}"]`);
+      if (!row) return;
+      if (line.qty > 0) {
+        const q = row.querySelector(".qty-value");
+        if (q) q.textContent = line.qty;
+        const sub = row.querySelector(".line-subtotal");
+        if (sub) sub.textContent = `$${line.line_subtotal.toFixed(2)}`;
+      } else {
+        row.remove();
+      }
+    });
+    const totalCell = document.querySelector(".cart-total-row td:last-child");
+    if (totalCell) totalCell.textContent = `$${data.total.toFixed(2)}`;
+    setCartBadge(data.cart_count);
+  }
+
+  document.querySelectorAll(".card-heart").forEach((btn) => {
+    btn.addEventListener("click", async (e) => {
+      e.preventDefault();
+      const id = btn.dataset.bookId;
+      // flip now; the batch response has the final say
+      const added = btn.classList.toggle("hearted");
+      showFlash(
+        added ? "Added to wishlist" : "Removed from wishlist",
+        added ? "success" : "error",
+      );
+      try {
+        const data = await queueWishlist({ op: "toggle", book_id: id });
+        if (!data) return;
+        if (id in data.wishlist)
+          btn.classList.toggle("hearted", data.wishlist[id]);
+        setWishlistBadge(data.count);
       } catch (err) {
+        btn.classList.toggle("hearted", !added);
         console.error("Wishlist toggle failed", err);
       }
     });
@@ -71,31 +178,12 @@ document.addEventListener("DOMContentLoaded", () => {
       e.preventDefault();
       const id = btn.dataset.bookId;
       try {
-        const res = await fetch(`/wishlist/toggle/${id}`, {
-          method: "POST",
-          credentials: "same-origin",
-        });
-        if (!res.ok) throw new Error("network");
-        const data = await res.json();
+        const data = await queueWishlist({ op: "remove", book_id: id });
         // remove DOM item
         const item = btn.closest(".wishlist-item");
         if (item) item.remove();
-        // update sidebar badge if present
-        const sb = document.getElementById("sb-wishlist");
-        if (sb) {
-          const badge = sb.querySelector(".sb-badge");
-          if (badge) {
-            if (data.count !== undefined) badge.textContent = data.count;
-            if (parseInt(badge.textContent || "0") <= 0) badge.remove();
-          } else if (data.count > 0) {
-            const el = document.createElement("span");
-            el.className = "sb-badge";
-            el.textContent = data.count;
-            sb.appendChild(el);
-          }
-        }
-        const msg = data.added ? "Added to wishlist" : "Removed from wishlist";
-        showFlash(msg, data.added ? "success" : "error");
+        if (data) setWishlistBadge(data.count);
+        showFlash("Removed from wishlist", "error");
       } catch (err) {
         console.error("Wishlist remove failed", err);
         showFlash("Could not update wishlist", "error");
@@ -109,23 +197,10 @@ document.addEventListener("DOMContentLoaded", () => {
       e.preventDefault();
       const id = btn.dataset.bookId;
       try {
-        const res = await fetch(`/wishlist/toggle/${id}`, {
-          method: "POST",
-          credentials: "same-origin",
-        });
-        if (!res.ok) throw new Error("network");
-        const data = await res.json();
+        const data = await queueWishlist({ op: "remove", book_id: id });
         const item = btn.closest(".wishlist-item");
         if (item) item.remove();
-        // update sidebar badge
-        const sb = document.getElementById("sb-wishlist");
-        if (sb) {
-          const badge = sb.querySelector(".sb-badge");
-          if (badge) {
-            if (data.count !== undefined) badge.textContent = data.count;
-            if (parseInt(badge.textContent || "0") <= 0) badge.remove();
-          }
-        }
+        if (data) setWishlistBadge(data.count);
         showFlash("Removed from wishlist", "success");
       } catch (err) {
         console.error("Wishlist cross remove failed", err);
@@ -134,55 +209,30 @@ document.addEventListener("DOMContentLoaded", () => {
     });
   });
 
+  // book id from a "/cart/add/<id>" form action
+  const cartFormBookId = (form) => {
+    const match = (form.getAttribute("action") || "").match(/\/cart\/add\/([^/?#]+)/);
+    return match ? decodeURIComponent(match[1]) : form.dataset.bookId;
+  };
+
   // Intercept Add-to-cart forms on the wishlist page to also remove the item from wishlist
   document.querySelectorAll(".wishlist-list form").forEach((form) => {
     form.addEventListener("submit", async (e) => {
       e.preventDefault();
-      const action = form.getAttribute("action");
-      // try extract book id from action or data
-      let match = action && action.match(/\/cart\/add\/(\d+)/);
-      let id = match
-        ? match[1]
-        : form.closest(".wishlist-item")?.dataset.bookId;
+      const id =
+        cartFormBookId(form) || form.closest(".wishlist-item")?.dataset.bookId;
+      if (!id) return;
       try {
-        const res = await fetch(action, {
-          method: "POST",
-          credentials: "same-origin",
-          headers: { Accept: "application/json" },
-        });
-        if (!res.ok) throw new Error("network");
-        // now remove from wishlist
-        if (id) {
-          const r2 = await fetch(`/wishlist/toggle/${id}`, {
-            method: "POST",
-            credentials: "same-origin",
-          });
-          if (r2.ok) {
-            const data = await r2.json();
-            const item = form.closest(".wishlist-item");
-            if (item) item.remove();
-            // update sidebar badge if present
-            const sb = document.getElementById("sb-wishlist");
-            if (sb) {
-              const badge = sb.querySelector(".sb-badge");
-              if (badge) {
-                if (data.count !== undefined) badge.textContent = data.count;
-                if (parseInt(badge.textContent || "0") <= 0) badge.remove();
-              }
-            }
-            // bump cart badge visually
-            const cartBadge = document.querySelector(
-              ".cart-btn .cart-badge, .nav-cart .cart-badge",
-            );
-            if (cartBadge) {
-              const v = parseInt(cartBadge.textContent || "0") + 1;
-              cartBadge.textContent = v;
-            }
-            showFlash("Added to cart and removed from wishlist", "success");
-          }
-        } else {
-          showFlash("Added to cart", "success");
-        }
+        // both batches go out together instead of one after the other
+        const [cart, wishlist] = await Promise.all([
+          queueCart({ op: "add", book_id: id, qty: 1 }),
+          queueWishlist({ op: "remove", book_id: id }),
+        ]);
+        const item = form.closest(".wishlist-item");
+        if (item) item.remove();
+        if (wishlist) setWishlistBadge(wishlist.count);
+        if (cart) setCartBadge(cart.cart_count);
+        showFlash("Added to cart and removed from wishlist", "success");
       } catch (err) {
         console.error("Add to cart failed", err);
         showFlash("Could not add to cart", "error");
@@ -192,27 +242,16 @@ document.addEventListener("DOMContentLoaded", () => {
 
   // Intercept general Add-to-cart forms (book cards, catalog) to use AJAX and avoid navigating to JSON
   document.querySelectorAll('form[action^="/cart/add/"]').forEach((form) => {
+    // wishlist page forms have their own handler above
+    if (form.closest(".wishlist-list")) return;
     form.addEventListener("submit", async (e) => {
       e.preventDefault();
-      const action = form.getAttribute("action");
+      const id = cartFormBookId(form);
+      if (!id) return;
+      showFlash("Added to cart", "success");
       try {
-        const res = await fetch(action, {
-          method: "POST",
-          credentials: "same-origin",
-          headers: { Accept: "application/json" },
-        });
-        if (!res.ok) throw new Error("network");
-        const data = await res.json();
-        // bump header cart badge
-        const cartBadge = document.querySelector(
-          ".cart-btn .cart-badge, .nav-cart .cart-badge",
-        );
-        if (cartBadge)
-          cartBadge.textContent =
-            data.count !== undefined
-              ? data.count
-              : parseInt(cartBadge.textContent || "0") + 1;
-        showFlash("Added to cart", "success");
+        const data = await queueCart({ op: "add", book_id: id, qty: 1 });
+        if (data) setCartBadge(data.cart_count);
       } catch (err) {
         console.error("Add to cart failed", err);
         showFlash("Could not add to cart", "error");
@@ -245,43 +284,15 @@ document.addEventListener("DOMContentLoaded", () => {
     btn.addEventListener("click", async (e) => {
       e.preventDefault();
       const bookId = btn.dataset.bookId || btn.closest("tr")?.dataset.bookId;
-      const op = btn.classList.contains("qty-increase") ? "inc" : "dec";
       if (!bookId) return;
+      const delta = btn.classList.contains("qty-increase") ? 1 : -1;
+      // show the new quantity right away; rapid clicks become one request
+      const q = document.querySelector(
+        `tr[data-book-id="${bookId}"] .qty-value`,
+      );
+      if (q) q.textContent = Math.max(0, parseInt(q.textContent || "0") + delta);
       try {
-        const form = new FormData();
-        form.append("op", op);
-        const res = await fetch(`/cart/update/${bookId}`, {
-          method: "POST",
-          credentials: "same-origin",
-          body: form,
-        });
-        if (!res.ok) throw new Error("network");
-        const data = await res.json();
-        // update qty value
-        const row = document.querySelector(`tr[data-book-id="${bookId}"]`);
-        if (row) {
-          const q = row.querySelector(".qty-value");
-          if (data.qty && data.qty > 0) {
-            if (q) q.textContent = data.qty;
-            const line = row.querySelector(".line-subtotal");
-            if (line)
-              line.textContent = `$${data.line_subtotal.toFixed ? data.line_subtotal.toFixed(2) : data.line_subtotal}`;
-          } else {
-            // remove row when qty reaches zero
-            row.remove();
-          }
-        }
-        // update total row
-        const totalCell = document.querySelector(
-          ".cart-total-row td:last-child",
-        );
-        if (totalCell)
-          totalCell.textContent = `$${data.total.toFixed ? data.total.toFixed(2) : data.total}`;
-        // update cart badge
-        const cartBadge = document.querySelector(
-          ".cart-btn .cart-badge, .nav-cart .cart-badge",
-        );
-        if (cartBadge) cartBadge.textContent = data.cart_count;
+        renderCart(await queueCart({ op: "add", book_id: bookId, qty: delta }));
       } catch (err) {
         console.error("Cart update failed", err);
         showFlash("Could not update cart", "error");
@@ -289,69 +300,17 @@ document.addEventListener("DOMContentLoaded", () => {
     });
   });
 
-  // Remove item from cart button
-  document.querySelectorAll(".cart-remove").forEach((btn) => {
-    btn.addEventListener("click", async (e) => {
-      e.preventDefault();
-      const bookId = btn.dataset.bookId;
-      if (!bookId) return;
-      try {
-        const res = await fetch(`/cart/remove/${bookId}`, {
-          method: "POST",
-          credentials: "same-origin",
-        });
-        if (!res.ok) throw new Error("network");
-        const data = await res.json();
-        // remove row
-        const row = document.querySelector(`tr[data-book-id="${bookId}"]`);
-        if (row) row.remove();
-        // update total cell and cart badge
-        const totalCell = document.querySelector(
-          ".cart-total-row td:last-child",
-        );
-        if (totalCell)
-          totalCell.textContent = `$${data.total.toFixed ? data.total.toFixed(2) : data.total}`;
-        const cartBadge = document.querySelector(
-          ".cart-btn .cart-badge, .nav-cart .cart-badge",
-        );
-        if (cartBadge) cartBadge.textContent = data.cart_count;
-        showFlash("Removed from cart", "success");
-      } catch (err) {
-        console.error("Cart remove failed", err);
-        showFlash("Could not remove item", "error");
-      }
-    });
-  });
-
-  // Small cross remove button (top-right of book cell)
-  document.querySelectorAll(".cart-remove-cross").forEach((btn) => {
+  // Remove item from cart (button and small cross at the top-right of the book cell)
+  document.querySelectorAll(".cart-remove, .cart-remove-cross").forEach((btn) => {
     btn.addEventListener("click", async (e) => {
       e.preventDefault();
       const bookId = btn.dataset.bookId || btn.closest("tr")?.dataset.bookId;
       if (!bookId) return;
       try {
-        const res = await fetch(`/cart/remove/${bookId}`, {
-          method: "POST",
-          credentials: "same-origin",
-        });
-        if (!res.ok) throw new Error("network");
-        const data = await res.json();
-        // remove row
-        const row = document.querySelector(`tr[data-book-id="${bookId}"]`);
-        if (row) row.remove();
-        // update total cell and cart badge
-        const totalCell = document.querySelector(
-          ".cart-total-row td:last-child",
-        );
-        if (totalCell)
-          totalCell.textContent = `$${data.total.toFixed ? data.total.toFixed(2) : data.total}`;
-        const cartBadge = document.querySelector(
-          ".cart-btn .cart-badge, .nav-cart .cart-badge",
-        );
-        if (cartBadge) cartBadge.textContent = data.cart_count;
+        renderCart(await queueCart({ op: "remove", book_id: bookId }));
         showFlash("Removed from cart", "success");
       } catch (err) {
-        console.error("Cart remove (cross) failed", err);
+        console.error("Cart remove failed", err);
         showFlash("Could not remove item", "error");
       }
     });
@@ -511,72 +470,45 @@ document.addEventListener("DOMContentLoaded", () => {
       wishBtn.addEventListener("click", async (e) => {
         e.preventDefault();
         const id = wishBtn.dataset.bookId;
-        try {
-          const res = await fetch(`/wishlist/toggle/${id}`, {
-            method: "POST",
-            credentials: "same-origin",
-          });
-          if (!res.ok) throw new Error("network");
-          const data = await res.json();
-          // update modal button label/state
-          wishBtn.textContent = data.added
+        const heart = document.querySelector(
+          `.card-heart[data-book-id="${id}"]`,
+        );
+        const show = (inWishlist) => {
+          wishBtn.textContent = inWishlist
             ? "Remove from wishlist"
             : "Add to wishlist";
-          // update corresponding card heart if present
-          const heart = document.querySelector(
-            `.card-heart[data-book-id="${id}"]`,
-          );
-          if (heart) {
-            if (data.added) heart.classList.add("hearted");
-            else heart.classList.remove("hearted");
-          }
-          // update sidebar badge if present
-          const sb = document.getElementById("sb-wishlist");
-          if (sb && data.count !== undefined) {
-            let badge = sb.querySelector(".sb-badge");
-            if (data.count > 0) {
-              if (!badge) {
-                badge = document.createElement("span");
-                badge.className = "sb-badge";
-                sb.appendChild(badge);
-              }
-              badge.textContent = data.count;
-            } else {
-              if (badge) badge.remove();
-            }
-          }
-          showFlash(
-            data.added ? "Added to wishlist" : "Removed from wishlist",
-            data.added ? "success" : "info",
-          );
+          if (heart) heart.classList.toggle("hearted", inWishlist);
+        };
+        const added = wishBtn.textContent.trim() === "Add to wishlist";
+        show(added);
+        showFlash(
+          added ? "Added to wishlist" : "Removed from wishlist",
+          added ? "success" : "info",
+        );
+        try {
+          const data = await queueWishlist({ op: "toggle", book_id: id });
+          if (!data) return;
+          if (id in data.wishlist) show(data.wishlist[id]);
+          setWishlistBadge(data.count);
         } catch (err) {
+          show(!added);
           console.error("Modal wishlist failed", err);
           showFlash("Could not update wishlist", "error");
         }
       });
     }
 
-    // When add to cart in modal is submitted, close modal after request
+    // When add to cart in modal is submitted, close modal right away
     if (addCartForm) {
       addCartForm.addEventListener("submit", async (e) => {
         e.preventDefault();
-        const action = addCartForm.action;
+        const id = cartFormBookId(addCartForm);
+        if (!id) return;
+        showFlash("Added to cart", "success");
+        closeModal();
         try {
-          const res = await fetch(action, {
-            method: "POST",
-            credentials: "same-origin",
-          });
-          if (!res.ok) throw new Error("network");
-          showFlash("Added to cart", "success");
-          closeModal();
-          // bump visual cart badge
-          const cartBadge = document.querySelector(
-            ".cart-btn .cart-badge, .nav-cart .cart-badge",
-          );
-          if (cartBadge) {
-            const v = parseInt(cartBadge.textContent || "0") + 1;
-            cartBadge.textContent = v;
-          }
+          const data = await queueCart({ op: "add", book_id: id, qty: 1 });
+          if (data) setCartBadge(data.cart_count);
         } catch (err) {
           console.error("Modal add to cart failed", err);
           showFlash("Could not add to cart", "error");
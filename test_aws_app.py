@@ -1,5 +1,3 @@
-from aws_app import app
-import aws_app
 import os
 import sys
 import boto3
@@ -17,6 +15,8 @@ mock = _mock_aws()
 mock.start()
 
 # Import the app AFTER starting moto so boto3 resources are intercepted
+from aws_app import app  # noqa: E402
+import aws_app  # noqa: E402
 
 
 def setup_infrastructure():
@@ -52,11 +52,34 @@ def setup_infrastructure():
     except Exception:
         pass
 
-    # Orders table (partition key: id)
+    # Orders table (partition key: id) with a status/created_at index
     try:
         dynamodb.create_table(
             TableName='BookBazaar_Orders',
             KeySchema=[{'AttributeName': 'id', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[
+                {'AttributeName': 'id', 'AttributeType': 'S'},
+                {'AttributeName': 'status', 'AttributeType': 'S'},
+                {'AttributeName': 'created_at', 'AttributeType': 'S'}],
+            GlobalSecondaryIndexes=[{
+                'IndexName': 'status-created_at-index',
+                'KeySchema': [{'AttributeName': 'status', 'KeyType': 'HASH'},
+                              {'AttributeName': 'created_at', 'KeyType': 'RANGE'}],
+                'Projection': {'ProjectionType': 'ALL'},
+                'ProvisionedThroughput': {
+                    'ReadCapacityUnits': 5, 'WriteCapacityUnits': 5}
+            }],
+            ProvisionedThroughput={
+                'ReadCapacityUnits': 5, 'WriteCapacityUnits': 5}
+        )
+    except Exception:
+        pass
+
+    # Recommendations table (partition key: id = book id)
+    try:
+        dynamodb.create_table(
+            TableName='BookBazaar_Recommendations',
+            KeySchema=[{'AttributeName': 'id', 'KeyType': 'HASH'}],
             AttributeDefinitions=[
                 {'AttributeName': 'id', 'AttributeType': 'S'}],
             ProvisionedThroughput={
@@ -65,6 +88,49 @@ def setup_infrastructure():
     except Exception:
         pass
 
+    # Rollups table (partition key: series, sort key: bucket)
+    try:
+        dynamodb.create_table(
+            TableName='BookBazaar_Rollups',
+            KeySchema=[{'AttributeName': 'series', 'KeyType': 'HASH'},
+                       {'AttributeName': 'bucket', 'KeyType': 'RANGE'}],
+            AttributeDefinitions=[
+                {'AttributeName': 'series', 'AttributeType': 'S'},
+                {'AttributeName': 'bucket', 'AttributeType': 'S'}],
+            ProvisionedThroughput={
+                'ReadCapacityUnits': 5, 'WriteCapacityUnits': 5}
+        )
+    except Exception:
+        pass
+
+    # Catalog change feed (partition key: feed, sort key: version)
+    try:
+        dynamodb.create_table(
+            TableName='BookBazaar_CatalogChanges',
+            KeySchema=[{'AttributeName': 'feed', 'KeyType': 'HASH'},
+                       {'AttributeName': 'version', 'KeyType': 'RANGE'}],
+            AttributeDefinitions=[
+                {'AttributeName': 'feed', 'AttributeType': 'S'},
+                {'AttributeName': 'version', 'AttributeType': 'N'}],
+            ProvisionedThroughput={
+                'ReadCapacityUnits': 5, 'WriteCapacityUnits': 5}
+        )
+    except Exception:
+        pass
+
+    # Sessions table (partition key: sid)
+    try:
+        dynamodb.create_table(
+            TableName='BookBazaar_Sessions',
+            KeySchema=[{'AttributeName': 'sid', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[
+                {'AttributeName': 'sid', 'AttributeType': 'S'}],
+            ProvisionedThroughput={
+                'ReadCapacityUnits': 5, 'WriteCapacityUnits': 5}
+        )
+    except Exception:
+        pass
+
     # Create an SNS topic and set it on the imported module so aws_app uses it
     response = sns.create_topic(Name='bookbazar_topic')
     aws_app.SNS_TOPIC_ARN = response['TopicArn']
@@ -0,0 +1,114 @@
+"""Catalog feed failures must never fail the Books write that caused them.
+
+Run with `python -m pytest test_catalog_feed.py` or
+`python -m unittest test_catalog_feed`. Uses the moto tables from
+test_aws_app.
+"""
+import unittest
+from decimal import Decimal
+from unittest import mock
+
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+# starts moto and imports aws_app against it
+from test_aws_app import setup_infrastructure
+import aws_app
+import catalog_feed
+
+EMAIL = 'buyer@example.com'
+BOOK_ID = 'feed-test-book'
+
+
+def _conflict(*args, **kwargs):
+    raise ClientError(
+        {'Error': {'Code': 'ConditionalCheckFailedException',
+                   'Message': 'The conditional request failed'}}, 'PutItem')
+
+
+def _entries():
+    return aws_app.catalog_feed.table.query(
+        KeyConditionExpression=Key('feed').eq(catalog_feed.FEED),
+        ConsistentRead=True)['Items']
+
+
+class CheckoutFeedConflictTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        setup_infrastructure()
+        aws_app.app.testing = True
+
+    def setUp(self):
+        aws_app.books_table.put_item(Item={
+            'id': BOOK_ID, 'title': 'Dune', 'author': 'Frank Herbert',
+            'genre': 'Sci-Fi', 'price': Decimal('9.99'), 'stock': 3,
+            'seller_email': 'seller@example.com', 'seller_name': 'S'})
+        aws_app.users_table.put_item(Item={
+            'email': EMAIL, 'name': 'Buyer', 'role': 'customer',
+            'cart': {BOOK_ID: 2}, 'cart_count': 2})
+        aws_app._feed_backlog.clear()
+        self.client = aws_app.app.test_client()
+        with self.client.session_transaction() as s:
+            s['user'] = {'email': EMAIL, 'name': 'Buyer',
+                         'is_admin': False, 'role': 'customer'}
+
+    def _orders(self):
+        return [o for o in aws_app.orders_table.scan()['Items']
+                if o.get('buyer_email') == EMAIL]
+
+    def test_checkout_survives_a_feed_conflict(self):
+        before = len(_entries())
+        feed_table = aws_app.catalog_feed.table
+        # the feed entry's put loses a conditional write; the replay thread
+        # is not started so the backlog can be inspected
+        with mock.patch.object(feed_table, 'put_item', side_effect=_conflict), \
+                mock.patch.object(aws_app.threading, 'Thread'):
+            resp = self.client.post('/payment', data={
+                'name': 'Buyer', 'line1': '1 Main St', 'city': 'Town'})
+
+        self.assertEqual(resp.status_code, 302)
+        self.assertTrue(resp.headers['Location'].endswith('/orders'))
+        self.assertEqual(len(self._orders()), 1)
+        user = aws_app.users_table.get_item(Key={'email': EMAIL})['Item']
+        self.assertEqual(user['cart'], {})
+        book = aws_app.books_table.get_item(Key={'id': BOOK_ID})['Item']
+        self.assertEqual(int(book['stock']), 1)
+        self.assertEqual(len(_entries()), before)
+        self.assertEqual(aws_app._feed_backlog[BOOK_ID][0], 'stock')
+
+        # once the feed works again the change is recorded from the book's
+        # current state and the backlog drains
+        aws_app._feed_replayer = None
+        with mock.patch.object(aws_app, 'FEED_REPLAY_INTERVAL', 0):
+            aws_app._replay_catalog_changes()
+        self.assertEqual(aws_app._feed_backlog, {})
+        last = max(_entries(), key=lambda e: int(e['version']))
+        self.assertEqual((last['op'], last['book_id'], int(last['book']['stock'])),
+                         ('stock', BOOK_ID, 1))
+
+    def test_lost_version_makes_readers_resync(self):
+        feed = aws_app.catalog_feed
+        start = feed.latest()
+        first = feed.record('update', BOOK_ID, {'title': 'Dune'})
+        # a writer takes a version and dies before writing its entry
+        lost = feed._allocate()
+        last = feed.record('update', BOOK_ID, {'title': 'Dune Messiah'})
+        self.assertEqual((first, lost, last), (start + 1, start + 2, start + 3))
+        self.assertEqual(feed.latest(), last)
+
+        # within the grace period readers stop before the gap
+        page = feed.changes(start)
+        self.assertEqual(page['version'], first)
+        self.assertFalse(page['reset'])
+        self.assertFalse(page['has_more'])
+
+        # after it they are told to reload rather than skip the change
+        now = catalog_feed.time.time() + catalog_feed.GAP_GRACE
+        with mock.patch.object(catalog_feed.time, 'time', return_value=now):
+            page = feed.changes(first)
+        self.assertTrue(page['reset'])
+        self.assertEqual(page['version'], last)
+
+
+if __name__ == '__main__':
+    unittest.main()
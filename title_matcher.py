@@ -0,0 +1,98 @@
+import re
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def normalize_tokens(text):
+    """Lowercase `text` and split it into alphanumeric word tokens."""
+    return _TOKEN_RE.findall((text or '').lower())
+
+
+class TitleMatcher:
+    """Aho-Corasick automaton over book titles and genres.
+
+    Patterns are matched on whole word tokens, so a single pass over the
+    message finds every title and genre it mentions regardless of how many
+    books are in the catalog. Working on words instead of characters keeps
+    the automaton small enough to hold 100k+ titles in memory.
+    """
+
+    def __init__(self, books):
+        # node -> {token: child}, failure link, and the patterns ending here
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        # nearest node on the failure chain that has outputs (or 0)
+        self._out_link = [0]
+        # pattern index -> ('book', id) or ('genre', name)
+        self._patterns = []
+
+        seen_genres = set()
+        for b in books:
+            bid = b.get('id')
+            if bid is not None and b.get('title'):
+                self._add(normalize_tokens(b['title']), ('book', str(bid)))
+            genre = b.get('genre')
+            if genre and genre not in seen_genres:
+                seen_genres.add(genre)
+                self._add(normalize_tokens(genre), ('genre', genre))
+        self._build_links()
+
+    def _add(self, tokens, value):
+        if not tokens:
+            return
+        node = 0
+        for tok in tokens:
+            nxt = self._goto[node].get(tok)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+                self._out_link.append(0)
+                self._goto[node][tok] = nxt
+            node = nxt
+        self._out[node].append(len(self._patterns))
+        self._patterns.append(value)
+
+    def _build_links(self):
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            for tok, child in self._goto[node].items():
+                f = self._fail[node]
+                while f and tok not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(tok, 0)
+                self._fail[child] = target if target != child else 0
+                fc = self._fail[child]
+                self._out_link[child] = fc if self._out[fc] else self._out_link[fc]
+                queue.append(child)
+
+    def find(self, message):
+        """Return every (kind, value) pattern mentioned in `message`, in order."""
+        found = []
+        seen = set()
+        node = 0
+        for tok in normalize_tokens(message):
+            while node and tok not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(tok, 0)
+            hit = node if self._out[node] else self._out_link[node]
+            while hit:
+                for idx in self._out[hit]:
+                    if idx not in seen:
+                        seen.add(idx)
+                        found.append(self._patterns[idx])
+                hit = self._out_link[hit]
+        return found
+
+    def match_books(self, message):
+        """Return ids of the books whose titles appear in `message`."""
+        return [v for kind, v in self.find(message) if kind == 'book']
+
+    def match_genres(self, message):
+        """Return the genres named in `message`."""
+        return [v for kind, v in self.find(message) if kind == 'genre']